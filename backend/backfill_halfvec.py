@@ -0,0 +1,39 @@
+"""
+Backfills document_chunks.embedding_half (phase16_halfvec.sql) in batches.
+
+Each call to backfill_halfvec_embeddings converts one batch in its own short
+transaction, so ingestion and retrieval keep running meanwhile. Safe to stop
+and re-run. When it reports 0 remaining, apply phase17_halfvec_cutover.sql.
+
+    python backfill_halfvec.py --batch-size 5000
+"""
+
+import argparse
+import time
+
+from database import supabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds between batches")
+    args = parser.parse_args()
+
+    total = 0
+    start = time.perf_counter()
+    while True:
+        response = supabase.rpc("backfill_halfvec_embeddings", {"batch_size": args.batch_size}).execute()
+        converted = response.data or 0
+        if not converted:
+            break
+        total += converted
+        elapsed = time.perf_counter() - start
+        print(f"Converted {total} chunks ({total / elapsed:.0f}/sec)")
+        time.sleep(args.pause)
+
+    print(f"Backfill done: {total} chunks converted. Apply phase17_halfvec_cutover.sql next.")
+
+
+if __name__ == "__main__":
+    main()
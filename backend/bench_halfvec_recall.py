@@ -0,0 +1,104 @@
+"""
+Checks that storing embeddings as halfvec (fp16) leaves retrieval unchanged.
+
+Builds one skill's corpus in fp32 and compares the top-k neighbours of a set
+of held-out queries against the same search over fp16-rounded vectors
+(exactly what halfvec stores). Exits non-zero if recall drops below the
+threshold.
+
+The fp32 corpus is re-encoded from the chunk text with the local model,
+since rows written by ChunkWriter are already fp16-rounded. With --stored
+it is read from the fp32 embedding column instead, which only exists
+before phase17_halfvec_cutover.sql and is only fp32 for rows written
+before the rounding.
+
+Queries never come from the corpus itself (a chunk is always its own top
+hit): either lines of --queries-file, or a sample of chunks held out of the
+corpus. Both are encoded in fp32, as the backend sends them.
+
+    python bench_halfvec_recall.py --skill-id <uuid> --k 5 --min-recall 0.99
+    python bench_halfvec_recall.py --skill-id <uuid> --queries-file questions.txt
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from database import supabase
+from studysensei_shared.embedding_backend import load_embedding_model
+from services.vector_index import _normalize, _parse_vector
+
+
+def load_chunks(skill_id: str, page_size: int = 1000):
+    chunks, start = [], 0
+    while True:
+        rows = supabase.table("document_chunks") \
+            .select("content, embedding") \
+            .eq("skill_id", skill_id) \
+            .order("id") \
+            .range(start, start + page_size - 1) \
+            .execute().data or []
+        chunks += [row for row in rows if row.get("embedding") is not None]
+        if len(rows) < page_size:
+            return chunks
+        start += page_size
+
+
+def top_k(matrix, queries, k):
+    scores = queries @ matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skill-id", required=True)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="chunks held out as queries (without --queries-file)")
+    parser.add_argument("--queries-file", help="one query per line")
+    parser.add_argument("--stored", action="store_true", help="use the pre-cutover fp32 embedding column")
+    parser.add_argument("--min-recall", type=float, default=0.99)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.skill_id)
+    model, model_id = load_embedding_model()
+
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+        corpus = chunks
+    else:
+        rng = np.random.default_rng(0)
+        held_out = set(rng.choice(len(chunks), size=min(args.queries, len(chunks) // 2), replace=False).tolist())
+        query_texts = [chunks[i]["content"] for i in sorted(held_out)]
+        corpus = [chunk for i, chunk in enumerate(chunks) if i not in held_out]
+
+    if len(corpus) <= args.k or not query_texts:
+        print(f"Skill has only {len(chunks)} chunks; nothing to compare.")
+        return
+
+    if args.stored:
+        full = np.vstack([_parse_vector(chunk["embedding"]) for chunk in corpus])
+    else:
+        full = np.asarray(model.encode([chunk["content"] for chunk in corpus]), dtype=np.float32)
+    full = _normalize(full)
+    half = _normalize(full.astype(np.float16).astype(np.float32))
+
+    # Queries stay fp32 (as sent by the backend); only the stored side is rounded
+    queries = _normalize(np.asarray(model.encode(query_texts), dtype=np.float32))
+    expected = top_k(full, queries, args.k)
+    found = top_k(half, queries, args.k)
+    recall = np.mean([len(set(e) & set(f)) / args.k for e, f in zip(expected, found)])
+
+    source = "stored fp32 column" if args.stored else f"re-encoded with {model_id}"
+    print(f"{len(corpus)} chunks ({source}), {len(query_texts)} held-out queries, k={args.k}")
+    print(f"Recall@{args.k} fp16 vs fp32: {recall:.4f}")
+    print(f"Vector storage per chunk: {full.shape[1] * 4} -> {full.shape[1] * 2} bytes")
+
+    if recall < args.min_recall:
+        print(f"FAIL: recall below {args.min_recall}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
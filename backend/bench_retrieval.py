@@ -0,0 +1,86 @@
+"""
+Benchmark: in-memory vector index vs. the match_documents RPC.
+
+Runs the same queries against one skill through both paths and reports
+p50/p99 latency (embedding excluded), plus how often the top results agree.
+
+    python bench_retrieval.py --skill-id <uuid> --queries 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from database import supabase
+from rag import rag_service
+
+QUERIES = [
+    "explain recursion with an example",
+    "what is the time complexity of binary search",
+    "summarize the key points of this chapter",
+    "how does photosynthesis work",
+    "difference between a process and a thread",
+    "what is supply and demand",
+    "give me a definition of entropy",
+    "how do I solve a quadratic equation",
+]
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+def timed(fn, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skill-id", required=True)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--match-count", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    args = parser.parse_args()
+
+    index = rag_service.vector_index
+    vectors = rag_service.encode(QUERIES)
+
+    start = time.perf_counter()
+    if index.search(args.skill_id, vectors[0], args.match_count, args.threshold) is None:
+        print("Skill is not served from memory (too many chunks or load failed).")
+        return
+    print(f"Cold load: {(time.perf_counter() - start) * 1000:.1f} ms, index stats {index.stats()}")
+
+    rpc_times, memory_times, overlap = [], [], []
+    for i in range(args.queries):
+        vector = vectors[i % len(vectors)]
+        params = {
+            "query_embedding": vector.tolist(),
+            "match_threshold": args.threshold,
+            "match_count": args.match_count,
+            "filter_skill_id": args.skill_id
+        }
+        samples, rpc_rows = timed(lambda: supabase.rpc("match_documents", params).execute().data, 1)
+        rpc_times += samples
+        samples, memory_rows = timed(lambda: index.search(args.skill_id, vector, args.match_count, args.threshold), 1)
+        memory_times += samples
+
+        rpc_ids = {row["id"] for row in rpc_rows}
+        if rpc_ids:
+            overlap.append(len(rpc_ids & {row["id"] for row in memory_rows}) / len(rpc_ids))
+
+    for name, samples in (("match_documents RPC", rpc_times), ("in-memory index", memory_times)):
+        print(f"{name:20}: p50 {percentile(samples, 50):8.2f} ms   p99 {percentile(samples, 99):8.2f} ms")
+    if overlap:
+        print(f"Top-{args.match_count} agreement with RPC: {np.mean(overlap):.1%}")
+
+
+if __name__ == "__main__":
+    main()
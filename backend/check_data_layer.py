@@ -0,0 +1,112 @@
+"""
+Check: async data layer (database.init_db / execute / rpc).
+
+Point SUPABASE_URL at a local stack (`supabase start`, or any PostgREST
+behind the Supabase gateway) and, for the asyncpg backend, DATABASE_URL at
+its Postgres (e.g. the compose `db` service). The script checks that
+
+- concurrent queries share one pooled HTTP/2 connection and don't stall the event loop
+- DB_TIMEOUT / the per-call timeout cuts off slow calls
+- match_documents returns the same rows over PostgREST and asyncpg
+
+    python check_data_layer.py --skill-id <uuid> --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import database
+from database import db, execute, init_db, close_db, rpc, DATABASE_URL
+from studysensei_shared.chunk_writer import format_vector
+
+
+async def loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.005):
+    """Records how late a periodic timer fires; large values mean something blocked the loop."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def check_concurrency(skill_id: str, concurrency: int) -> bool:
+    stop, lag = asyncio.Event(), []
+    watcher = asyncio.create_task(loop_lag(stop, lag))
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        execute(db().table("documents").select("id").eq("skill_id", skill_id).limit(5))
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+
+    # Same pooled httpx client the Supabase client uses
+    probe = await database._http.get(f"{database.url}/rest/v1/", headers={"apikey": database.key})
+    worst = max(lag) * 1000 if lag else 0.0
+    print(f"{len(responses)} concurrent queries: {elapsed * 1000:.0f} ms, worst loop lag {worst:.1f} ms, "
+          f"{probe.http_version}")
+    return worst < 50
+
+
+async def check_timeout() -> bool:
+    try:
+        # pg_sleep through PostgREST isn't exposed, so use a timeout no round trip can meet
+        await execute(db().table("documents").select("id").limit(1), timeout=0.0001)
+    except asyncio.TimeoutError:
+        print("Per-call timeout: raised asyncio.TimeoutError as expected")
+        return True
+    print("Per-call timeout: call finished inside 0.1 ms (timeout not observed)")
+    return False
+
+
+async def check_rpc_parity(skill_id: str) -> bool:
+    if not DATABASE_URL:
+        print("DATABASE_URL not set; skipping PostgREST/asyncpg parity")
+        return True
+
+    from rag import rag_service
+    embedding = rag_service.encode("explain the main idea of this chapter")
+    params = {
+        "query_embedding": format_vector(embedding),
+        "match_threshold": 0.0,
+        "match_count": 5,
+        "filter_skill_id": skill_id,
+        "ef_search": 40
+    }
+    over_rest = await rpc("match_documents", params)
+
+    database._pool = await database._create_pool(DATABASE_URL)
+    try:
+        over_pg = await rpc("match_documents", params)
+    finally:
+        await database._pool.close()
+        database._pool = None
+
+    same = [row["id"] for row in over_rest] == [row["id"] for row in over_pg]
+    print(f"match_documents parity: PostgREST {len(over_rest)} rows, asyncpg {len(over_pg)} rows, "
+          f"{'identical' if same else 'DIFFERENT'} order")
+    return same
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skill-id", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    await init_db()
+    try:
+        results = [
+            await check_concurrency(args.skill_id, args.concurrency),
+            await check_timeout(),
+            await check_rpc_parity(args.skill_id),
+        ]
+    finally:
+        await close_db()
+    print("OK" if all(results) else "FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
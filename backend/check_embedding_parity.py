@@ -0,0 +1,82 @@
+"""
+Checks that the ONNX embedding backends match the fp32 PyTorch model and
+measures their speed. Exits non-zero if any backend drifts past the
+cosine-similarity tolerance, since stored chunk vectors and query vectors
+may come from different backends.
+
+    python check_embedding_parity.py --tolerance 0.98
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from studysensei_shared.embedding_backend import load_embedding_model
+
+SAMPLES = [
+    "Recursion is when a function calls itself until it reaches a base case.",
+    "The mitochondria is the powerhouse of the cell.",
+    "Supply and demand determine the equilibrium price in a competitive market.",
+    "A binary search tree keeps smaller keys in the left subtree and larger keys in the right.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "quiz me on recursion",
+    "What is the derivative of x squared?",
+    "Explain the difference between TCP and UDP.",
+]
+
+
+def timed_encode(model, texts, repeats):
+    model.encode(texts[:8])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        vectors = model.encode(texts, batch_size=64)
+    return np.asarray(vectors, dtype=np.float32), (time.perf_counter() - start) / repeats
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tolerance", type=float, default=0.98, help="minimum per-text cosine vs fp32")
+    parser.add_argument("--texts", type=int, default=512, help="texts in the speed benchmark")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # Long-ish chunk-sized texts for the speed test
+    texts = [" ".join(SAMPLES[(i + j) % len(SAMPLES)] for j in range(6)) for i in range(args.texts)]
+
+    reference, reference_id = load_embedding_model("torch")
+    ref_vectors, ref_seconds = timed_encode(reference, texts, args.repeats)
+    ref_samples = np.asarray(reference.encode(SAMPLES), dtype=np.float32)
+    print(f"{reference_id}: {args.texts / ref_seconds:.1f} texts/sec")
+
+    ok = True
+    for backend in ("onnx", "onnx-int8"):
+        model, model_id = load_embedding_model(backend)
+        if model_id == reference_id:
+            print(f"❌ {backend}: could not be loaded")
+            ok = False
+            continue
+
+        vectors, seconds = timed_encode(model, texts, args.repeats)
+        similarity = np.concatenate([
+            cosine_rows(ref_vectors, vectors),
+            cosine_rows(ref_samples, np.asarray(model.encode(SAMPLES), dtype=np.float32)),
+        ])
+        worst = float(similarity.min())
+        passed = worst >= args.tolerance
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {model_id}: min cosine {worst:.4f}, mean {similarity.mean():.4f}, "
+              f"{args.texts / seconds:.1f} texts/sec ({ref_seconds / seconds:.2f}x vs fp32)")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Load test for non-blocking LLM calls, using a fake slow LLM (no Gemini key).
+
+Fires N concurrent requests through services.llm_client.invoke_llm while a
+heartbeat task measures event-loop stalls, then does the same with the old
+blocking llm.invoke() pattern for comparison. Exits non-zero if the async path
+stalls the loop or doesn't run LLM_MAX_CONCURRENCY calls in parallel.
+
+    LLM_MAX_CONCURRENCY=8 python check_llm_concurrency.py --requests 32 --delay 0.5
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+import time
+from types import SimpleNamespace
+
+from services.llm_client import LLM_MAX_CONCURRENCY, invoke_llm
+
+
+class FakeSlowLLM:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def invoke(self, prompt):
+        time.sleep(self.delay)
+        return SimpleNamespace(content=f"answer to {prompt}")
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(content=f"answer to {prompt}")
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01):
+    """Largest gap between ticks, i.e. the longest time the loop was blocked."""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        worst = max(worst, now - last - interval)
+        last = now
+    return worst
+
+
+async def run(handler, requests: int):
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await beat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per fake LLM call")
+    args = parser.parse_args()
+
+    llm = FakeSlowLLM(args.delay)
+
+    async def async_handler(i):
+        return await invoke_llm(llm, f"q{i}")
+
+    async def blocking_handler(i):
+        # What the routers did before: a sync call inside an async def
+        return llm.invoke(f"q{i}").content
+
+    expected = math.ceil(args.requests / LLM_MAX_CONCURRENCY) * args.delay
+    elapsed, stall = asyncio.run(run(async_handler, args.requests))
+    print(f"invoke_llm (cap {LLM_MAX_CONCURRENCY}): {args.requests} requests in {elapsed:.2f}s "
+          f"(ideal {expected:.2f}s), worst loop stall {stall * 1000:.0f} ms")
+
+    blocking_elapsed, blocking_stall = asyncio.run(run(blocking_handler, args.requests))
+    print(f"blocking llm.invoke : {args.requests} requests in {blocking_elapsed:.2f}s, "
+          f"worst loop stall {blocking_stall * 1000:.0f} ms")
+
+    failures = []
+    if elapsed > expected + args.delay:
+        failures.append("async calls did not overlap up to the concurrency cap")
+    if stall > args.delay / 2:
+        failures.append("event loop was blocked during async calls")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
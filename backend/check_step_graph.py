@@ -0,0 +1,75 @@
+"""
+Check for services.step_graph using the chat handler's step layout with
+simulated latencies (no database, model or Gemini key).
+
+Runs the chat graph (create chat row, encode, match_documents, history,
+prompt, LLM answer, save) once as a graph and once step by step, and
+prints both wall times and the per-step timings. Exits non-zero if the
+graph is not close to its critical path or a failing step doesn't cancel
+the rest.
+
+    python check_step_graph.py --db-ms 40 --encode-ms 15 --llm-ms 300
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from services.step_graph import StepGraph, step_stats
+
+
+def build_graph(args, name: str = "chat") -> StepGraph:
+    async def wait(ms, value=None):
+        await asyncio.sleep(ms / 1000)
+        return value
+
+    graph = StepGraph(name)
+    graph.add("chat_id", lambda: wait(args.db_ms, "chat-1"))
+    graph.add("embedding", lambda: wait(args.encode_ms, [0.1] * 384))
+    graph.add("matches", lambda embedding: wait(args.db_ms, ["chunk"]), ["embedding"])
+    graph.add("history", lambda: wait(args.db_ms, ""))
+    graph.add("prompt", lambda matches, history: f"{matches} {history}", ["matches", "history"])
+    graph.add("answer", lambda prompt: wait(args.llm_ms, "answer"), ["prompt"])
+    graph.add("saved", lambda chat_id, answer: wait(args.db_ms * 2), ["chat_id", "answer"])
+    return graph
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-ms", type=float, default=40)
+    parser.add_argument("--encode-ms", type=float, default=15)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    # Old handler: every step after the previous one
+    sequential_ms = 3 * args.db_ms + args.encode_ms + args.llm_ms + 2 * args.db_ms
+    # Graph: max(encode + match, history) -> answer -> save; the chat row overlaps all of it
+    critical_ms = max(args.encode_ms + args.db_ms, args.db_ms) + args.llm_ms + 2 * args.db_ms
+
+    start = time.perf_counter()
+    results = await build_graph(args).run()
+    wall_ms = (time.perf_counter() - start) * 1000
+    print(f"Graph: {wall_ms:.0f} ms (critical path {critical_ms:.0f} ms, sequential {sequential_ms:.0f} ms)")
+    print(f"Stats: {step_stats()['chat']}")
+
+    ok = results["answer"] == "answer" and wall_ms < critical_ms + 50
+
+    failing = build_graph(args, "failing")
+    failing.add("broken", lambda: 1 / 0)
+    start = time.perf_counter()
+    try:
+        await failing.run()
+        ok = False
+        print("Failing step: graph did not raise")
+    except ZeroDivisionError:
+        cancelled_ms = (time.perf_counter() - start) * 1000
+        print(f"Failing step: raised after {cancelled_ms:.0f} ms, remaining steps cancelled")
+        ok = ok and cancelled_ms < args.db_ms
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Checks that the SSE streaming path delivers the first token long before the
+answer is complete, using a fake streaming LLM (no Gemini key or database).
+Exits non-zero if sources aren't the first event, the answer isn't saved
+before "done", or time-to-first-token isn't well under the full generation time.
+Also checks that a slow client doesn't hold the LLM slot and that a client
+disconnecting mid-answer still gets the partial answer saved.
+
+    python check_stream_ttft.py --first-token-ms 200 --token-ms 50 --tokens 40
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from services.llm_client import llm_stats
+from services.llm_stream import stream_llm_events
+
+
+class FakeStreamingLLM:
+    def __init__(self, first_token: float, per_token: float, tokens: int):
+        self.first_token = first_token
+        self.per_token = per_token
+        self.tokens = tokens
+
+    async def astream(self, prompt):
+        await asyncio.sleep(self.first_token)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.per_token)
+            yield SimpleNamespace(content=f"token{i} ")
+
+
+def parse(event: str):
+    name, data = event.strip().split("\n", 1)
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def run(args):
+    llm = FakeStreamingLLM(args.first_token_ms / 1000, args.token_ms / 1000, args.tokens)
+    saved = []
+
+    def on_complete(content):
+        saved.append(content)
+        return {"chat_id": "chat-1"}
+
+    start = time.perf_counter()
+    timeline = []
+    async for event in stream_llm_events(llm, "prompt", {"chat_id": "chat-1", "sources": []}, on_complete):
+        timeline.append((time.perf_counter() - start, *parse(event)))
+    return timeline, saved
+
+
+async def run_slow_client(args):
+    """Reads tokens slower than they are generated; the slot should be free before the last one."""
+    llm = FakeStreamingLLM(0, args.token_ms / 1000, 10)
+    in_flight = None
+    async for event in stream_llm_events(llm, "prompt", {}, lambda content: None):
+        if parse(event)[0] == "token":
+            await asyncio.sleep(args.token_ms * 3 / 1000)
+            in_flight = llm_stats()["in_flight"]
+    return in_flight
+
+
+async def run_disconnect(args):
+    """Drops the stream after three tokens, like a closed browser tab."""
+    llm = FakeStreamingLLM(0, args.token_ms / 1000, args.tokens)
+    saved, received = [], []
+    events = stream_llm_events(llm, "prompt", {}, lambda content: saved.append(content))
+    async for event in events:
+        name, data = parse(event)
+        if name == "token":
+            received.append(data["text"])
+            if len(received) == 3:
+                break
+    await events.aclose()
+    await asyncio.sleep(args.token_ms * 2 / 1000)
+    return "".join(received), saved, llm_stats()["in_flight"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    timeline, saved = asyncio.run(run(args))
+    names = [name for _, name, _ in timeline]
+    tokens = [(at, data) for at, name, data in timeline if name == "token"]
+    ttft = tokens[0][0] if tokens else float("inf")
+    total = timeline[-1][0]
+
+    print(f"Events: sources={names.count('sources')} tokens={len(tokens)} done={names.count('done')}")
+    print(f"Sources event after {timeline[0][0] * 1000:.1f} ms")
+    print(f"Time to first token: {ttft * 1000:.1f} ms, complete after {total * 1000:.1f} ms")
+
+    failures = []
+    if names[0] != "sources":
+        failures.append("first event is not 'sources'")
+    if names[-1] != "done" or not saved:
+        failures.append("answer was not saved before 'done'")
+    elif saved[0] != "".join(data["text"] for _, data in tokens):
+        failures.append("saved answer differs from streamed tokens")
+    # Without streaming the first byte would arrive at `total`
+    if ttft > args.first_token_ms / 1000 + 0.1 or ttft > total / 2:
+        failures.append("first token arrived too late")
+
+    slow_in_flight = asyncio.run(run_slow_client(args))
+    print(f"Slow client: {slow_in_flight} LLM slots in use at its last token")
+    if slow_in_flight:
+        failures.append("slow client kept the LLM slot after generation ended")
+
+    received, saved, in_flight = asyncio.run(run_disconnect(args))
+    print(f"Disconnect after 3 tokens: saved {len(saved[0]) if saved else 0} chars, {in_flight} LLM slots in use")
+    if not saved or not saved[0].startswith(received):
+        failures.append("partial answer was not saved after disconnect")
+    if in_flight:
+        failures.append("LLM slot not released after disconnect")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
+import asyncio
 import os
-from supabase import create_client, Client
+import uuid
+from typing import Any, Optional
+
+import httpx
+from supabase import create_client, Client, acreate_client, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,4 +21,158 @@ else:
 if not url or not key:
     raise ValueError("Supabase URL and Key must be set in .env file")
 
+# Blocking client for scripts and code that already runs off the event loop
+# (chunk writer, vector index loader). Request handlers use the async layer below.
 supabase: Client = create_client(url, key)
+
+# --- Async data layer -------------------------------------------------------
+#
+# One AsyncClient per process shares a pooled HTTP/2 connection to PostgREST
+# and Storage, so handlers never block the event loop on a query and don't
+# open a connection per request. Every call goes through execute()/rpc(),
+# which bound it with DB_TIMEOUT; file uploads pass the longer STORAGE_TIMEOUT.
+#
+# DB_BACKEND=asyncpg sends rpc() calls (the retrieval functions) straight to
+# Postgres over an asyncpg pool on DATABASE_URL instead of through PostgREST;
+# table queries keep using PostgREST either way.
+
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "10"))
+DB_CONNECT_TIMEOUT = float(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
+STORAGE_TIMEOUT = float(os.environ.get("STORAGE_TIMEOUT", "60"))
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "32"))
+DB_BACKEND = os.environ.get("DB_BACKEND", "postgrest")
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+_db: Optional[AsyncClient] = None
+_http: Optional[httpx.AsyncClient] = None
+_pool = None
+_init_lock = asyncio.Lock()
+
+
+async def init_db() -> AsyncClient:
+    """Creates the shared async client (and asyncpg pool if enabled). Safe to call repeatedly."""
+    global _db, _http, _pool
+    async with _init_lock:
+        if _db is not None:
+            return _db
+
+        _http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=DB_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_MAX_CONNECTIONS,
+            ),
+            # Sized for uploads; queries are still cut off at DB_TIMEOUT by execute()
+            timeout=httpx.Timeout(max(DB_TIMEOUT, STORAGE_TIMEOUT), connect=DB_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        options = AsyncClientOptions(
+            httpx_client=_http,
+            postgrest_client_timeout=DB_TIMEOUT,
+            storage_client_timeout=max(DB_TIMEOUT, STORAGE_TIMEOUT),
+        )
+        _db = await acreate_client(url, key, options=options)
+
+        if DB_BACKEND == "asyncpg":
+            if not DATABASE_URL:
+                print("DB_BACKEND=asyncpg needs DATABASE_URL; RPCs stay on PostgREST.")
+            else:
+                _pool = await _create_pool(DATABASE_URL)
+        return _db
+
+
+async def _create_pool(dsn: str):
+    try:
+        import asyncpg
+    except ImportError:
+        print("asyncpg not installed; RPCs stay on PostgREST.")
+        return None
+
+    async def setup(conn):
+        # pgvector types travel as their text form ("[0.1,0.2,...]"), like over PostgREST
+        rows = await conn.fetch(
+            "SELECT t.typname, n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace "
+            "WHERE t.typname IN ('vector', 'halfvec')"
+        )
+        for row in rows:
+            await conn.set_type_codec(
+                row["typname"], schema=row["nspname"], encoder=str, decoder=str, format="text"
+            )
+
+    pool = await asyncpg.create_pool(
+        dsn,
+        min_size=1,
+        max_size=DB_MAX_CONNECTIONS,
+        command_timeout=DB_TIMEOUT,
+        init=setup,
+    )
+    print(f"asyncpg pool ready (max {DB_MAX_CONNECTIONS} connections)")
+    return pool
+
+
+async def close_db():
+    global _db, _http, _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+    _db = None
+
+
+def db() -> AsyncClient:
+    """The shared async client; init_db() runs at application startup."""
+    if _db is None:
+        raise RuntimeError("Async database client not initialized; await init_db() first")
+    return _db
+
+
+def http() -> httpx.AsyncClient:
+    """The HTTP client behind db(), for calls to the other internal services."""
+    if _http is None:
+        raise RuntimeError("Async database client not initialized; await init_db() first")
+    return _http
+
+
+def pg_pool():
+    """The asyncpg pool when DB_BACKEND=asyncpg is active, else None."""
+    return _pool
+
+
+async def execute(query: Any, timeout: float = None) -> Any:
+    """
+    Runs a PostgREST request builder (anything with .execute()) or awaits a
+    storage call, failing with asyncio.TimeoutError after `timeout` seconds
+    (DB_TIMEOUT by default).
+    """
+    awaitable = query.execute() if hasattr(query, "execute") else query
+    return await asyncio.wait_for(awaitable, timeout or DB_TIMEOUT)
+
+
+def _plain(value):
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+async def rpc(fn: str, params: dict, timeout: float = None) -> list:
+    """
+    Calls a Postgres function and returns its rows as dicts, through the
+    asyncpg pool when enabled and PostgREST otherwise.
+    """
+    if _pool is None:
+        response = await execute(db().rpc(fn, params), timeout)
+        return response.data or []
+
+    names = list(params)
+    arguments = ", ".join(f"{name} => ${i}" for i, name in enumerate(names, start=1))
+    sql = f"SELECT * FROM {fn}({arguments})"
+    rows = await _pool.fetch(sql, *(params[name] for name in names), timeout=timeout or DB_TIMEOUT)
+    return [{column: _plain(value) for column, value in row.items()} for row in rows]
+
+
+def db_stats() -> dict:
+    stats = {"backend": "asyncpg" if _pool is not None else "postgrest", "timeout": DB_TIMEOUT}
+    if _pool is not None:
+        stats["pool_size"] = _pool.get_size()
+        stats["pool_idle"] = _pool.get_idle_size()
+    return stats
@@ -0,0 +1,62 @@
+"""
+Builds the per-skill partial HNSW indexes (phase13_chunk_skill_id.sql)
+without blocking ingestion.
+
+skill_vector_index_plan() lists the skills over --min-chunks that have no
+valid index yet, each with its CREATE INDEX CONCURRENTLY statement. That
+statement can't run inside a transaction, so this script runs it over a
+direct connection (DATABASE_URL) in autocommit mode; chunk inserts keep
+going while the graph is built. A build that failed half-way leaves an
+invalid index behind, which is dropped and rebuilt. Safe to stop and
+re-run; meant to run periodically (e.g. from cron).
+
+    python ensure_skill_indexes.py --min-chunks 10000 --maintenance-work-mem 1GB
+"""
+
+import argparse
+import sys
+import time
+
+import psycopg2
+
+from database import DATABASE_URL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-chunks", type=int, default=10000)
+    parser.add_argument("--maintenance-work-mem", help="e.g. 1GB, so the graph is built in memory")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("DATABASE_URL must point at the Postgres behind SUPABASE_URL.")
+        sys.exit(1)
+
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if args.maintenance_work_mem:
+                cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (args.maintenance_work_mem,))
+            cur.execute(
+                "SELECT skill_id, index_name, rebuild, create_statement FROM skill_vector_index_plan(%s)",
+                (args.min_chunks,),
+            )
+            plan = cur.fetchall()
+            if not plan:
+                print(f"Every skill with {args.min_chunks}+ chunks has its index.")
+                return
+
+            for skill_id, index_name, rebuild, create_statement in plan:
+                start = time.perf_counter()
+                if rebuild:
+                    cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS public."{index_name}"')
+                cur.execute(create_statement)
+                print(f"Built {index_name} for skill {skill_id} in {time.perf_counter() - start:.1f}s"
+                      f"{' (replaced an invalid index)' if rebuild else ''}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
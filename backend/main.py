@@ -34,10 +34,33 @@ app.include_router(roadmap.router)
 from routers import skills
 app.include_router(skills.router)
 
+@app.on_event("startup")
+async def startup():
+    # Shared async Supabase client (HTTP/2 pool) and, with DB_BACKEND=asyncpg, the Postgres pool
+    from database import init_db
+    await init_db()
+
+@app.on_event("shutdown")
+async def shutdown():
+    from database import close_db
+    await close_db()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to StudySensei API"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    from rag import rag_service
+    from services.llm_client import llm_stats
+    from database import db_stats
+    from services.step_graph import step_stats
+    cache = rag_service.embedding_cache
+    return {
+        "status": "ok",
+        "embedding_cache": cache.stats() if cache else None,
+        "vector_index": rag_service.vector_index.stats(),
+        "llm": llm_stats(),
+        "database": db_stats(),
+        "steps": step_stats()
+    }
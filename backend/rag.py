@@ -1,53 +1,140 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-from database import supabase
-import uuid
+from database import supabase, rpc
+from studysensei_shared.chunk_writer import format_vector
+from studysensei_shared.embedding_cache import EmbeddingCache, CachedEncoder
+from studysensei_shared.embedding_backend import load_embedding_model
+from services.embedding_client import RemoteEncoder, EMBEDDING_SERVICE_URL
+from services.vector_index import VectorIndex
+import asyncio
+import os
+
+# HNSW candidate list size for the match_documents RPC (higher = better recall, slower)
+MATCH_EF_SEARCH = int(os.environ.get("MATCH_EF_SEARCH", "40"))
+# Queries of at most this many words go through match_documents_hybrid (0 disables)
+HYBRID_MAX_WORDS = int(os.environ.get("HYBRID_MAX_WORDS", "6"))
 
 class RAGService:
     def __init__(self):
         # Initialize the embedding model
         # all-MiniLM-L6-v2 creates 384-dimensional vectors
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # With EMBEDDING_SERVICE_URL set, the shared embedder sidecar holds the only copy of the model.
+        # Otherwise EMBEDDING_BACKEND=onnx-int8 runs a quantized graph locally (see studysensei_shared/embedding_backend.py)
+        if EMBEDDING_SERVICE_URL:
+            # The cache is keyed by the model the sidecar reports, not this process's EMBEDDING_BACKEND
+            self.model, self.model_id = RemoteEncoder(EMBEDDING_SERVICE_URL), None
+        else:
+            self.model, self.model_id = load_embedding_model()
+        
+        # Repeated chunks and queries are served from a local on-disk cache
+        try:
+            self.embedding_cache = EmbeddingCache()
+        except Exception as e:
+            print(f"Embedding cache disabled: {e}")
+            self.embedding_cache = None
+        self.encoder = CachedEncoder(self.model, self.embedding_cache, self.model_id)
         
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
+        # Hot skills are searched in memory instead of through the match_documents RPC
+        self.vector_index = VectorIndex(supabase)
 
-    async def process_document(self, document_id: str, content: str):
+    def encode(self, texts):
         """
-        Splits content into chunks, generates embeddings, and stores them in Supabase.
+        Embeds a string (returns one vector) or a list of strings, consulting the cache first.
         """
-        try:
-            # 1. Split text into chunks
-            chunks = self.text_splitter.split_text(content)
-            
-            # 2. Generate embeddings for all chunks
-            embeddings = self.model.encode(chunks)
-            
-            # 3. Prepare data for insertion
-            records = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                records.append({
-                    "document_id": document_id,
-                    "content": chunk,
-                    "embedding": embedding.tolist(),
-                    "chunk_index": i
-                })
-            
-            # 4. Insert into Supabase
-            if records:
-                supabase.table("document_chunks").insert(records).execute()
-            
-            # 5. Mark document as processed
-            supabase.table("documents").update({"processed": True}).eq("id", document_id).execute()
-            
-            return True
-        except Exception as e:
-            print(f"Error processing document {document_id}: {e}")
-            return False
+        return self.encoder.encode(texts)
+
+    async def match_documents(self, query: str, skill_id: str, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        Returns the chunks of a skill most similar to the query, as match_documents rows
+        (id, content, similarity). Served from the in-memory index when the skill fits.
+        Encoding and index loads run in a worker thread, RPCs on the async data layer.
+        """
+        if not skill_id:
+            return []
+        query_embedding = await asyncio.to_thread(self.encode, query)
+        return await self.search(query, query_embedding, skill_id, match_count, match_threshold)
+
+    async def search(self, query: str, query_embedding, skill_id: str, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        match_documents for an already encoded query (lets callers encode in a separate step).
+        """
+        # Chats without a skill have no documents to search
+        if not skill_id:
+            return []
+        # Short keyword-like queries: full-text and vector candidates fused
+        # (vector side from memory when the skill is loaded, see hybrid_search)
+        if len(query.split()) <= HYBRID_MAX_WORDS:
+            try:
+                return await self.hybrid_search(query, query_embedding, skill_id, match_count, match_threshold)
+            except Exception as e:
+                print(f"Hybrid search failed, using vector search: {e}")
+        
+        matches = await asyncio.to_thread(self.vector_index.search, skill_id, query_embedding, match_count, match_threshold)
+        if matches is not None:
+            return matches
+        
+        params = {
+            "query_embedding": format_vector(query_embedding),
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter_skill_id": skill_id,
+            "ef_search": MATCH_EF_SEARCH
+        }
+        return await rpc("match_documents", params)
+
+    async def match_documents_multi(self, queries, skill_id: str, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        Retrieval for several queries with one encode call and one round trip.
+        Returns one list of matches per query; a chunk retrieved by several queries
+        only appears under the query it matches best.
+        """
+        if not queries:
+            return []
+        if not skill_id:
+            return [[] for _ in queries]
+        query_embeddings = await asyncio.to_thread(self.encode, list(queries))
+        results = await asyncio.to_thread(self.vector_index.search_many, skill_id, query_embeddings, match_count, match_threshold)
+        if results is not None:
+            return results
+        
+        params = {
+            "query_embeddings": [format_vector(embedding) for embedding in query_embeddings],
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter_skill_id": skill_id,
+            "ef_search": MATCH_EF_SEARCH
+        }
+        rows = await rpc("match_documents_multi", params)
+        results = [[] for _ in queries]
+        for row in rows:
+            results[row["query_index"]].append(row)
+        return results
+
+    async def hybrid_search(self, query: str, query_embedding, skill_id: str, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        Reciprocal rank fusion of full-text and vector matches. When the skill is served
+        from the in-memory index only the lexical candidates are fetched
+        (match_documents_lexical) and fused here; otherwise match_documents_hybrid does both.
+        """
+        if await asyncio.to_thread(self.vector_index.serves, skill_id):
+            lexical = await rpc("match_documents_lexical", {
+                "query_text": query,
+                "candidate_count": match_count * 4,
+                "filter_skill_id": skill_id
+            })
+            matches = await asyncio.to_thread(
+                self.vector_index.hybrid_search, skill_id, query_embedding, lexical, match_count, match_threshold
+            )
+            if matches is not None:
+                return matches
+        
+        params = {
+            "query_text": query,
+            "query_embedding": format_vector(query_embedding),
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "filter_skill_id": skill_id,
+            "ef_search": MATCH_EF_SEARCH
+        }
+        return await rpc("match_documents_hybrid", params)
 
 # Singleton instance
 rag_service = RAGService()
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List, Any
-from database import supabase
+from database import db, execute
 import datetime
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -25,7 +25,7 @@ async def log_metric(payload: MetricLog):
             "max_score": payload.max_score,
             "metadata": payload.metadata
         }
-        res = supabase.table("progress_metrics").insert(data).execute()
+        res = await execute(db().table("progress_metrics").insert(data))
         return {"status": "success", "id": res.data[0]['id']}
     except Exception as e:
         print(f"Log Metric Error: {e}")
@@ -35,12 +35,11 @@ async def log_metric(payload: MetricLog):
 async def get_skill_analytics(skill_id: str, user_id: str):
     try:
         # Fetch metrics for this user and skill
-        response = supabase.table("progress_metrics") \
+        response = await execute(db().table("progress_metrics") \
             .select("*") \
             .eq("skill_id", skill_id) \
             .eq("user_id", user_id) \
-            .order("created_at", desc=False) \
-            .execute()
+            .order("created_at", desc=False))
         
         metrics = response.data
         
@@ -1,9 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from database import supabase
+from database import db, execute
 from rag import rag_service
+from services.context_builder import build_context
+from services.llm_client import invoke_llm
+from services.llm_stream import stream_llm_events, SSE_HEADERS
+from services.step_graph import StepGraph
 from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Optional
+import asyncio
 import os
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -19,117 +25,135 @@ class ChatMessage(BaseModel):
 # Ensure GOOGLE_API_KEY is set in .env
 llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
 
+async def create_chat(payload: ChatMessage) -> str:
+    """Returns the chat id, creating the chat row for a new conversation."""
+    if payload.chat_id:
+        return payload.chat_id
+    chat_data = {
+        "user_id": payload.user_id,
+        "skill_id": payload.skill_id,
+        "title": payload.message[:50] + "..." if len(payload.message) > 50 else payload.message
+    }
+    chat_res = await execute(db().table("chats").insert(chat_data))
+    return chat_res.data[0]['id']
+
+async def fetch_history(chat_id: Optional[str]) -> str:
+    # A chat created by this request has no history yet
+    if not chat_id:
+        return ""
+    recent_messages = await execute(db().table("messages") \
+        .select("role, content") \
+        .eq("chat_id", chat_id) \
+        .order("created_at", desc=True) \
+        .limit(10))
+    
+    # Reverse to get chronological order
+    history_text = ""
+    for msg in reversed(recent_messages.data):
+        role = "Student" if msg['role'] == "user" else "Teacher"
+        history_text += f"{role}: {msg['content']}\n"
+    return history_text
+
+def build_chat_prompt(payload: ChatMessage, matches, history_text: str) -> str:
+    print(f"RAG Matches found: {len(matches)}") # Debug log
+    
+    # Context: adjacent chunks stitched, duplicates dropped, token-budgeted
+    context_text = build_context(matches)
+    
+    system_prompt = """You are StudySensei, an AI tutor. Use the following context to answer the student's question. 
+    If the answer is not in the context, say you don't know but try to be helpful based on general knowledge.
+    Keep answers concise and encouraging."""
+    
+    return f"{system_prompt}\n\nContext:\n{context_text}\n\nConversation History:\n{history_text}\nStudent: {payload.message}\nTeacher:"
+
+def chat_graph(payload: ChatMessage, name: str = "chat") -> StepGraph:
+    """
+    Shared by /message and /message/stream, which time their steps under
+    separate names ("chat" and "chat_stream"). Creating the chat row,
+    retrieval (encode -> match_documents) and loading the history run
+    concurrently; the chat id is only needed once the exchange is saved.
+    """
+    graph = StepGraph(name)
+    graph.add("chat_id", lambda: create_chat(payload))
+    graph.add("embedding", lambda: asyncio.to_thread(rag_service.encode, payload.message))
+    # In-memory index for hot skills, the 'match_documents' RPC otherwise
+    graph.add("matches", lambda embedding: rag_service.search(
+        payload.message,
+        embedding,
+        payload.skill_id,
+        match_count=5,
+        match_threshold=0.3  # Lowered threshold for better recall
+    ), ["embedding"])
+    graph.add("history", lambda: fetch_history(payload.chat_id))
+    graph.add("prompt", lambda matches, history: build_chat_prompt(payload, matches, history), ["matches", "history"])
+    return graph
+
+async def save_chat_exchange(chat_id: str, payload: ChatMessage, content: str):
+    # Save User Message
+    await execute(db().table("messages").insert({
+        "chat_id": chat_id,
+        "role": "user",
+        "content": payload.message,
+        "mode": payload.mode
+    }))
+    
+    # Save AI Message
+    await execute(db().table("messages").insert({
+        "chat_id": chat_id,
+        "role": "assistant",
+        "content": content,
+        "mode": payload.mode
+    }))
+
 @router.post("/message")
 async def chat_message(payload: ChatMessage):
     try:
-        # 0. Ensure Chat ID exists
-        chat_id = payload.chat_id
-        if not chat_id:
-            # Create new chat
-            chat_data = {
-                "user_id": payload.user_id,
-                "skill_id": payload.skill_id,
-                "title": payload.message[:50] + "..." if len(payload.message) > 50 else payload.message
-            }
-            chat_res = supabase.table("chats").insert(chat_data).execute()
-            chat_id = chat_res.data[0]['id']
-
-        # 1. Generate embedding for the user query
-        query_embedding = rag_service.model.encode(payload.message).tolist()
-        
-        # 2. Search for relevant chunks in Supabase
-        # We use the RPC function 'match_documents' we defined in SQL
-        params = {
-            "query_embedding": query_embedding,
-            "match_threshold": 0.3, # Lowered threshold for better recall
-            "match_count": 5,
-            "filter_skill_id": payload.skill_id
-        }
-        response = supabase.rpc("match_documents", params).execute()
-        matches = response.data
-        
-        print(f"RAG Matches found: {len(matches)}") # Debug log
-        
-        # 3. Construct Context
-        context_text = "\n\n".join([match['content'] for match in matches])
-        
-        # 3.5 Fetch Chat History
-        history_text = ""
-        if chat_id:
-            recent_messages = supabase.table("messages") \
-                .select("role, content") \
-                .eq("chat_id", chat_id) \
-                .order("created_at", desc=True) \
-                .limit(10) \
-                .execute()
-            
-            # Reverse to get chronological order
-            for msg in reversed(recent_messages.data):
-                role = "Student" if msg['role'] == "user" else "Teacher"
-                history_text += f"{role}: {msg['content']}\n"
-
-        # 4. Construct Prompt
-        system_prompt = """You are StudySensei, an AI tutor. Use the following context to answer the student's question. 
-        If the answer is not in the context, say you don't know but try to be helpful based on general knowledge.
-        Keep answers concise and encouraging."""
-        
-        full_prompt = f"{system_prompt}\n\nContext:\n{context_text}\n\nConversation History:\n{history_text}\nStudent: {payload.message}\nTeacher:"
-        
-        # 5. Generate Answer with LLM
-        # For streaming, we'd use StreamingResponse, but for MVP simple return
-        ai_response = llm.invoke(full_prompt)
-        
-        # Helper to ensure content is string
-        content = ai_response.content
-        if not isinstance(content, str):
-            if isinstance(content, list):
-                extracted = []
-                for part in content:
-                    if isinstance(part, dict) and 'text' in part:
-                        extracted.append(part['text'])
-                    elif isinstance(part, str):
-                        extracted.append(part)
-                content = "".join(extracted)
-            elif hasattr(content, 'parts'):
-                 content = "".join([part.text for part in content.parts])
-            else:
-                content = str(content)
-        
-        # 6. Save Chat History
-        # Save User Message
-        supabase.table("messages").insert({
-            "chat_id": chat_id,
-            "role": "user",
-            "content": payload.message,
-            "mode": payload.mode
-        }).execute()
-        
-        # Save AI Message
-        supabase.table("messages").insert({
-            "chat_id": chat_id,
-            "role": "assistant",
-            "content": content,
-            "mode": payload.mode
-        }).execute()
+        graph = chat_graph(payload)
+        # Generate Answer with LLM (see /message/stream for the streaming variant);
+        # the chat row may still be being created meanwhile
+        graph.add("answer", lambda prompt: invoke_llm(llm, prompt), ["prompt"])
+        # Save Chat History
+        graph.add("saved", lambda chat_id, content: save_chat_exchange(chat_id, payload, content), ["chat_id", "answer"])
+        results = await graph.run()
         
         return {
-            "chat_id": chat_id,
-            "response": content,
-            "sources": matches
+            "chat_id": results["chat_id"],
+            "response": results["answer"],
+            "sources": results["matches"]
         }
 
     except Exception as e:
         print(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/message/stream")
+async def chat_message_stream(payload: ChatMessage):
+    """
+    Same as /message, streamed as Server-Sent Events:
+    "sources" first, then "token" events, then "done" once the messages are saved.
+    """
+    try:
+        results = await chat_graph(payload, "chat_stream").run()
+        chat_id, matches, full_prompt = results["chat_id"], results["matches"], results["prompt"]
+    except Exception as e:
+        print(f"Chat Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def on_complete(content: str):
+        await save_chat_exchange(chat_id, payload, content)
+        return {"chat_id": chat_id}
+
+    events = stream_llm_events(llm, full_prompt, {"chat_id": chat_id, "sources": matches}, on_complete)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.delete("/{chat_id}")
 async def delete_chat(chat_id: str):
     try:
         # 1. Delete messages
-        supabase.table("messages").delete().eq("chat_id", chat_id).execute()
+        await execute(db().table("messages").delete().eq("chat_id", chat_id))
         
         # 2. Delete chat
-        supabase.table("chats").delete().eq("id", chat_id).execute()
+        await execute(db().table("chats").delete().eq("id", chat_id))
         
         return {"status": "success", "message": "Chat deleted"}
     except Exception as e:
@@ -3,7 +3,9 @@ from typing import List
 import shutil
 import os
 from uuid import uuid4
-from database import supabase
+from database import db, execute, STORAGE_TIMEOUT
+from services.worker_wakeup import notify_worker
+from rag import rag_service
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -24,19 +26,21 @@ async def upload_document(
         file_ext = file.filename.split(".")[-1]
         storage_path = f"{user_id}/{skill_id}/{uuid4()}.{file_ext}"
         
+        # Without the file the worker can't process the row, so don't create it
         try:
-            supabase.storage.from_("documents").upload(
+            await execute(db().storage.from_("documents").upload(
                 path=storage_path,
                 file=file_content,
                 file_options={"content-type": file.content_type}
-            )
+            ), timeout=STORAGE_TIMEOUT)
         except Exception as e:
-            print(f"Supabase Storage upload failed (ensure 'documents' bucket exists): {e}")
+            print(f"Supabase Storage upload failed (ensure 'documents' bucket exists): {e!r}")
+            raise HTTPException(status_code=500, detail=f"File upload to storage failed: {e!r}")
 
         # 3. Save metadata to DB (skip extraction and processing)
         # Get public URL if possible, otherwise use storage path
         try:
-            public_url = supabase.storage.from_("documents").get_public_url(storage_path)
+            public_url = await db().storage.from_("documents").get_public_url(storage_path)
         except:
             public_url = storage_path
 
@@ -45,26 +49,92 @@ async def upload_document(
             "skill_id": skill_id,
             "filename": file.filename,
             "file_url": public_url,
+            "file_size": len(file_content),  # Cost estimate for fair scheduling
             "processed": False,
             "status": "pending",
             "error_message": None
         }
-        response = supabase.table("documents").insert(data).execute()
+        response = await execute(db().table("documents").insert(data))
         document_id = response.data[0]['id']
 
-        # Processing will be picked up by the background worker monitoring 'pending' status
+        # Processing will be picked up by the background worker monitoring 'pending' status.
+        # The insert trigger notifies it via LISTEN/NOTIFY; the UDP nudge covers local dev.
+        notify_worker(document_id)
 
         return {"status": "success", "document_id": document_id, "message": "File uploaded. Processing started in background."}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.put("/{document_id}")
+async def replace_document(
+    document_id: str,
+    file: UploadFile = File(...)
+):
+    """
+    Uploads a revised version of a document. The worker re-ingests it incrementally:
+    unchanged chunks keep their embeddings, only changed ones are re-embedded.
+    """
+    try:
+        doc = await execute(db().table("documents").select("*").eq("id", document_id).single())
+        if not doc.data:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        old_file_url = doc.data['file_url']
+        
+        # 1. Upload the new version next to the old one
+        file_content = await file.read()
+        file_ext = file.filename.split(".")[-1]
+        storage_path = f"{doc.data['user_id']}/{doc.data['skill_id']}/{uuid4()}.{file_ext}"
+        await execute(db().storage.from_("documents").upload(
+            path=storage_path,
+            file=file_content,
+            file_options={"content-type": file.content_type}
+        ), timeout=STORAGE_TIMEOUT)
+        
+        try:
+            public_url = await db().storage.from_("documents").get_public_url(storage_path)
+        except:
+            public_url = storage_path
+        
+        # 2. Point the row at the new file and re-queue it (existing chunks stay searchable meanwhile).
+        # Releasing the lease makes a worker still busy with the old version drop its result.
+        await execute(db().table("documents").update({
+            "filename": file.filename,
+            "file_url": public_url,
+            "file_size": len(file_content),
+            "processed": False,
+            "status": "pending",
+            "error_message": None,
+            "attempts": 0,
+            "locked_by": None,
+            "lease_expires_at": None
+        }).eq("id", document_id))
+        notify_worker(document_id)
+        
+        # 3. Drop the old file
+        if "/documents/" in old_file_url:
+            try:
+                await execute(db().storage.from_("documents").remove([old_file_url.split("/documents/")[-1]]))
+            except Exception as e:
+                print(f"Old file cleanup failed: {e}")
+        
+        return {"status": "success", "document_id": document_id, "message": "File replaced. Re-processing started in background."}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Replace error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/{document_id}")
 async def delete_document(document_id: str):
     try:
         # 1. Get document to find storage path
-        doc = supabase.table("documents").select("*").eq("id", document_id).single().execute()
+        doc = await execute(db().table("documents").select("*").eq("id", document_id).single())
         if not doc.data:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -74,14 +144,18 @@ async def delete_document(document_id: str):
         # Extract path from URL: .../documents/path/to/file
         if "/documents/" in file_url:
             storage_path = file_url.split("/documents/")[-1]
-            supabase.storage.from_("documents").remove([storage_path])
+            await execute(db().storage.from_("documents").remove([storage_path]))
         
         # 3. Delete from DB
         # Explicitly delete chunks first to ensure no orphans (even if cascade is missing)
-        supabase.table("document_chunks").delete().eq("document_id", document_id).execute()
+        await execute(db().table("document_chunks").delete().eq("document_id", document_id))
         
         # Then delete the document
-        supabase.table("documents").delete().eq("id", document_id).execute()
+        await execute(db().table("documents").delete().eq("id", document_id))
+        
+        # Stop serving its chunks from this process's vector index right away
+        if doc.data.get('skill_id'):
+            rag_service.vector_index.invalidate(doc.data['skill_id'])
         
         return {"status": "success", "message": "Document deleted"}
         
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from database import supabase
+from database import db, execute
 from rag import rag_service
+from services.context_builder import build_context
+from services.llm_client import invoke_llm
+from services.llm_stream import stream_llm_events, SSE_HEADERS
+from services.step_graph import StepGraph
 from langchain_google_genai import ChatGoogleGenerativeAI
 import json
+import re
 
 router = APIRouter(prefix="/mentor", tags=["mentor"])
 
@@ -18,152 +24,180 @@ class MentorMessage(BaseModel):
     message: str
     mode: str = "explain" # explain, quiz, plan, coach
 
+async def create_mentor_chat(payload: MentorMessage) -> str:
+    """Returns the chat id, creating the chat row for a new conversation."""
+    if payload.chat_id:
+        return payload.chat_id
+    chat_data = {
+        "user_id": payload.user_id,
+        "skill_id": payload.skill_id,
+        "title": f"[{payload.mode.upper()}] " + (payload.message[:30] + "..." if len(payload.message) > 30 else payload.message)
+    }
+    chat_res = await execute(db().table("chats").insert(chat_data))
+    return chat_res.data[0]['id']
+
+async def fetch_mentor_context(payload: MentorMessage):
+    """
+    Returns (sources, context_text).
+    """
+    # 1. Fetch Context (RAG) - Common for Explain, Quiz, Plan
+    # Coach might not need deep RAG, but context helps personalization.
+    context_text = ""
+    sources = []
+
+    if payload.mode in ["explain", "quiz", "plan"]:
+        try:
+            sources = await rag_service.match_documents(payload.message, payload.skill_id, match_count=5, match_threshold=0.3)
+            context_text = build_context(sources)
+        except Exception as e:
+            print(f"RAG Error: {e}")
+
+    # 1.5 Fallback for Quiz: If Context is empty, fetch random chunks from the skill
+    # This prevents "random trivia" when the user just says "give me a quiz"
+    if payload.mode == "quiz" and not context_text:
+        try:
+            # Get documents for this skill
+            doc_res = await execute(db().table("documents").select("id").eq("skill_id", payload.skill_id))
+            doc_ids = [d['id'] for d in doc_res.data]
+
+            if doc_ids:
+                # Fetch random chunks (limit 5)
+                chunk_res = await execute(db().table("document_chunks") \
+                    .select("content") \
+                    .in_("document_id", doc_ids) \
+                    .limit(5))
+
+                if chunk_res.data:
+                    print("Using fallback context for quiz.")
+                    sources = [{"content": c['content']} for c in chunk_res.data]
+                    context_text = build_context(sources)
+        except Exception as e:
+            print(f"Fallback Context Error: {e}")
+
+    return sources, context_text
+
+def build_mentor_prompt(payload: MentorMessage, context_text: str) -> str:
+    # 2. Select Agent / Prompt
+    system_prompt = ""
+
+    if payload.mode == "explain":
+        system_prompt = """You are the 'Deep Explainer' agent. 
+        Goal: Explain concepts clearly, using analogies and simple terms. 
+        Use the provided context to ground your explanation. 
+        If the context is insufficient, rely on your general knowledge but mention that it's general info.
+        Style: Educational, patient, clear."""
+
+    elif payload.mode == "quiz":
+        system_prompt = """You are the 'Examiner' agent.
+        Goal: Generate a mini-quiz (3 questions) based on the user's request and provided context.
+        Output Format: JSON ONLY.
+        Structure: 
+        [
+            { "question": "...", "options": ["a", "b", "c", "d"], "answer": "correct option content", "explanation": "..." },
+            ...
+        ]
+        Do not include any conversational text outside the JSON."""
+
+    elif payload.mode == "plan":
+        system_prompt = """You are the 'Study Architect' agent.
+        Goal: Create a structured study plan based on the user's goal and available materials (context).
+        Output: Markdown formatted plan with days/steps.
+        Style: Structured, actionable, motivating."""
+
+    elif payload.mode == "coach":
+        system_prompt = """You are the 'Motivator' agent.
+        Goal: Encourage the student, help them overcome procrastination or frustration.
+        Style: High energy, empathetic, inspiring. Short and punchy."""
+
+    else:
+        # Fallback
+        system_prompt = "You are a helpful AI tutor."
+
+    # 3. Build the prompt
+    return f"{system_prompt}\n\nContext:\n{context_text}\n\nUser Request: {payload.message}\nAgent Response:"
+
+def mentor_graph(payload: MentorMessage, name: str = "mentor") -> StepGraph:
+    """
+    Shared by /message and /message/stream, which time their steps under
+    separate names ("mentor" and "mentor_stream"). Creating the chat row
+    runs concurrently with retrieval; the chat id is only needed once the
+    exchange is saved.
+    """
+    graph = StepGraph(name)
+    graph.add("chat_id", lambda: create_mentor_chat(payload))
+    graph.add("context", lambda: fetch_mentor_context(payload))
+    graph.add("prompt", lambda context: build_mentor_prompt(payload, context[1]), ["context"])
+    return graph
+
+def clean_mentor_response(mode: str, content: str) -> str:
+    # Post-processing for Quiz
+    if mode == "quiz":
+        # Clean JSON
+        content = re.sub(r"```json\s*", "", content)
+        content = re.sub(r"```\s*$", "", content)
+        content = content.strip()
+    return content
+
+async def save_mentor_exchange(chat_id: str, payload: MentorMessage, content: str):
+    # User Msg
+    await execute(db().table("messages").insert({
+        "chat_id": chat_id,
+        "role": "user",
+        "content": payload.message,
+        "mode": payload.mode
+    }))
+    
+    # AI Msg
+    await execute(db().table("messages").insert({
+        "chat_id": chat_id,
+        "role": "assistant",
+        "content": content,
+        "mode": payload.mode
+    }))
+
 @router.post("/message")
 async def mentor_message(payload: MentorMessage):
     try:
-        # 0. Ensure Chat ID exists
-        chat_id = payload.chat_id
-        if not chat_id:
-            chat_data = {
-                "user_id": payload.user_id,
-                "skill_id": payload.skill_id,
-                "title": f"[{payload.mode.upper()}] " + (payload.message[:30] + "..." if len(payload.message) > 30 else payload.message)
-            }
-            chat_res = supabase.table("chats").insert(chat_data).execute()
-            chat_id = chat_res.data[0]['id']
-
-        # 1. Fetch Context (RAG) - Common for Explain, Quiz, Plan
-        # Coach might not need deep RAG, but context helps personalization.
-        context_text = ""
-        sources = []
-        
-        if payload.mode in ["explain", "quiz", "plan"]:
-            query_embedding = rag_service.model.encode(payload.message).tolist()
-            params = {
-                "query_embedding": query_embedding,
-                "match_threshold": 0.3, 
-                "match_count": 5,
-                "filter_skill_id": payload.skill_id
-            }
-            try:
-                response = supabase.rpc("match_documents", params).execute()
-                sources = response.data
-                context_text = "\n\n".join([match['content'] for match in sources])
-            except Exception as e:
-                print(f"RAG Error: {e}")
-
-        # 1.5 Fallback for Quiz: If Context is empty, fetch random chunks from the skill
-        # This prevents "random trivia" when the user just says "give me a quiz"
-        if payload.mode == "quiz" and not context_text:
-            try:
-                # Get documents for this skill
-                doc_res = supabase.table("documents").select("id").eq("skill_id", payload.skill_id).execute()
-                doc_ids = [d['id'] for d in doc_res.data]
-                
-                if doc_ids:
-                    # Fetch random chunks (limit 5)
-                    chunk_res = supabase.table("document_chunks") \
-                        .select("content") \
-                        .in_("document_id", doc_ids) \
-                        .limit(5) \
-                        .execute()
-                    
-                    if chunk_res.data:
-                        print("Using fallback context for quiz.")
-                        sources = [{"content": c['content']} for c in chunk_res.data]
-                        context_text = "\n\n".join([c['content'] for c in sources])
-            except Exception as e:
-                print(f"Fallback Context Error: {e}")
-
-        # 2. Select Agent / Prompt
-        system_prompt = ""
-        
-        if payload.mode == "explain":
-            system_prompt = """You are the 'Deep Explainer' agent. 
-            Goal: Explain concepts clearly, using analogies and simple terms. 
-            Use the provided context to ground your explanation. 
-            If the context is insufficient, rely on your general knowledge but mention that it's general info.
-            Style: Educational, patient, clear."""
-        
-        elif payload.mode == "quiz":
-            system_prompt = """You are the 'Examiner' agent.
-            Goal: Generate a mini-quiz (3 questions) based on the user's request and provided context.
-            Output Format: JSON ONLY.
-            Structure: 
-            [
-                { "question": "...", "options": ["a", "b", "c", "d"], "answer": "correct option content", "explanation": "..." },
-                ...
-            ]
-            Do not include any conversational text outside the JSON."""
+        graph = mentor_graph(payload)
         
-        elif payload.mode == "plan":
-            system_prompt = """You are the 'Study Architect' agent.
-            Goal: Create a structured study plan based on the user's goal and available materials (context).
-            Output: Markdown formatted plan with days/steps.
-            Style: Structured, actionable, motivating."""
-            
-        elif payload.mode == "coach":
-            system_prompt = """You are the 'Motivator' agent.
-            Goal: Encourage the student, help them overcome procrastination or frustration.
-            Style: High energy, empathetic, inspiring. Short and punchy."""
-        
-        else:
-            # Fallback
-            system_prompt = "You are a helpful AI tutor."
+        # 4. Generate Response (see /message/stream for the streaming variant)
+        async def answer(prompt: str) -> str:
+            return clean_mentor_response(payload.mode, await invoke_llm(llm, prompt))
+        graph.add("answer", answer, ["prompt"])
 
-        # 3. Generate Response
-        full_prompt = f"{system_prompt}\n\nContext:\n{context_text}\n\nUser Request: {payload.message}\nAgent Response:"
-        
-        ai_response = llm.invoke(full_prompt)
-        content = ai_response.content
-        
-        # Helper to ensure content is string (Gemini sometimes returns complex objects)
-        if not isinstance(content, str):
-            if isinstance(content, list):
-                extracted = []
-                for part in content:
-                    if isinstance(part, dict) and 'text' in part:
-                        extracted.append(part['text'])
-                    elif isinstance(part, str):
-                        extracted.append(part)
-                content = "".join(extracted)
-            elif hasattr(content, 'parts'):
-                 content = "".join([part.text for part in content.parts])
-            else:
-                content = str(content)
-        
-        # Post-processing for Quiz
-        if payload.mode == "quiz":
-            # Clean JSON
-            import re
-            content = re.sub(r"```json\s*", "", content)
-            content = re.sub(r"```\s*$", "", content)
-            content = content.strip()
-
-        # 4. Save History
-        # User Msg
-        supabase.table("messages").insert({
-            "chat_id": chat_id,
-            "role": "user",
-            "content": payload.message,
-            "mode": payload.mode
-        }).execute()
-        
-        # AI Msg
-        supabase.table("messages").insert({
-            "chat_id": chat_id,
-            "role": "assistant",
-            "content": content,
-            "mode": payload.mode
-        }).execute()
+        # 5. Save History
+        graph.add("saved", lambda chat_id, content: save_mentor_exchange(chat_id, payload, content), ["chat_id", "answer"])
+        results = await graph.run()
 
         return {
-            "chat_id": chat_id,
-            "response": content,
+            "chat_id": results["chat_id"],
+            "response": results["answer"],
             "mode": payload.mode,
-            "sources": sources
+            "sources": results["context"][0]
         }
 
     except Exception as e:
         print(f"Mentor Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/message/stream")
+async def mentor_message_stream(payload: MentorMessage):
+    """
+    Same as /message, streamed as Server-Sent Events:
+    "sources" first, then "token" events, then "done" once the messages are saved.
+    Quiz JSON is streamed raw; the saved copy is cleaned like in /message.
+    """
+    try:
+        results = await mentor_graph(payload, "mentor_stream").run()
+        chat_id, (sources, _), full_prompt = results["chat_id"], results["context"], results["prompt"]
+    except Exception as e:
+        print(f"Mentor Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def on_complete(content: str):
+        await save_mentor_exchange(chat_id, payload, clean_mentor_response(payload.mode, content))
+        return {"chat_id": chat_id, "mode": payload.mode}
+
+    first_event = {"chat_id": chat_id, "mode": payload.mode, "sources": sources}
+    events = stream_llm_events(llm, full_prompt, first_event, on_complete)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
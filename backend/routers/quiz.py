@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-from database import supabase
+from database import db, execute
+from rag import rag_service
+from services.context_builder import build_context
+from services.llm_client import invoke_llm
 from langchain_google_genai import ChatGoogleGenerativeAI
 import json
 import re
@@ -12,6 +15,7 @@ router = APIRouter(prefix="/quiz", tags=["quiz"])
 class QuizRequest(BaseModel):
     skill_id: str
     topic: Optional[str] = None
+    topics: Optional[List[str]] = None # Multi-topic quiz: context is retrieved per topic
     num_questions: int = 5
 
 class Question(BaseModel):
@@ -49,7 +53,7 @@ async def save_quiz(payload: QuizResult):
             "score": payload.score,
             "total_questions": payload.total_questions
         }
-        quiz_res = supabase.table("quizzes").insert(data).execute()
+        quiz_res = await execute(db().table("quizzes").insert(data))
         quiz_id = quiz_res.data[0]['id']
 
         # 2. Save Questions
@@ -66,7 +70,7 @@ async def save_quiz(payload: QuizResult):
             })
         
         if questions_data:
-            supabase.table("quiz_questions").insert(questions_data).execute()
+            await execute(db().table("quiz_questions").insert(questions_data))
 
         # 3. Log to Analytics (Progress Metrics)
         analytics_data = {
@@ -77,43 +81,60 @@ async def save_quiz(payload: QuizResult):
             "max_score": payload.total_questions,
             "metadata": {"total_questions": payload.total_questions}
         }
-        supabase.table("progress_metrics").insert(analytics_data).execute()
+        await execute(db().table("progress_metrics").insert(analytics_data))
 
         return {"status": "success", "message": "Quiz result saved"}
     except Exception as e:
         print(f"Save Quiz Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def random_context(skill_id: str) -> str:
+    response = await execute(db().table("documents") \
+        .select("id") \
+        .eq("skill_id", skill_id))
+
+    doc_ids = [d['id'] for d in response.data]
+
+    if not doc_ids:
+        raise HTTPException(status_code=404, detail="No documents found for this skill")
+
+    chunks_response = await execute(db().table("document_chunks") \
+        .select("content") \
+        .in_("document_id", doc_ids) \
+        .limit(10))
+
+    return "\n".join([c['content'] for c in chunks_response.data])
+
+async def topic_context(skill_id: str, topics: List[str]) -> str:
+    # One encode call and one match_documents_multi round trip for all topics
+    per_topic = await rag_service.match_documents_multi(topics, skill_id, match_count=4, match_threshold=0.3)
+    budget = 3000 // 4 // len(topics) # The prompt keeps ~3000 characters of context
+    sections = []
+    for topic, matches in zip(topics, per_topic):
+        if matches:
+            sections.append(f"Topic: {topic}\n{build_context(matches, max_tokens=budget)}")
+    if not sections:
+        return await random_context(skill_id)
+    return "\n\n".join(sections)
+
 @router.post("/generate", response_model=QuizResponse)
 async def generate_quiz(payload: QuizRequest):
     try:
-        # 1. Fetch random chunks
-        response = supabase.table("documents") \
-            .select("id") \
-            .eq("skill_id", payload.skill_id) \
-            .execute()
-        
-        doc_ids = [d['id'] for d in response.data]
-        
-        if not doc_ids:
-            raise HTTPException(status_code=404, detail="No documents found for this skill")
-
-        chunks_response = supabase.table("document_chunks") \
-            .select("content") \
-            .in_("document_id", doc_ids) \
-            .limit(10) \
-            .execute()
-            
-        context = "\n".join([c['content'] for c in chunks_response.data])
-        
+        # 1. Fetch context: per-topic retrieval in one batch, or random chunks
+        topics = payload.topics or ([payload.topic] if payload.topic else [])
+        topics = [t.strip() for t in topics if t and t.strip()]
+        if topics:
+            context = await topic_context(payload.skill_id, topics)
+        else:
+            context = await random_context(payload.skill_id)
+
         # 2. Fetch previous questions to avoid repetition
         # Get last 20 questions for this skill
-        prev_questions_res = supabase.table("quiz_questions") \
+        prev_questions_res = await execute(db().table("quiz_questions") \
             .select("question") \
             .eq("skill_id", payload.skill_id) \
             .order("created_at", desc=True) \
-            .limit(20) \
-            .execute()
+            .limit(20))
             
         prev_questions = [q['question'] for q in prev_questions_res.data]
         
@@ -139,11 +160,11 @@ async def generate_quiz(payload: QuizRequest):
         ]
         """
         
-        ai_response = llm.invoke(prompt)
+        ai_response = await invoke_llm(llm, prompt)
         
         # 3. Clean and Parse JSON
         # Sometimes LLMs add ```json ... ```
-        cleaned_json = re.sub(r'```json\s*|\s*```', '', ai_response.content).strip()
+        cleaned_json = re.sub(r'```json\s*|\s*```', '', ai_response).strip()
         
         questions_data = json.loads(cleaned_json)
         
@@ -179,20 +200,18 @@ async def generate_quiz(payload: QuizRequest):
 async def get_quiz_history(skill_id: str):
     try:
         # Fetch quizzes for this skill with their questions
-        quizzes_response = supabase.table("quizzes") \
+        quizzes_response = await execute(db().table("quizzes") \
             .select("*") \
             .eq("skill_id", skill_id) \
             .order("created_at", desc=True) \
-            .limit(10) \
-            .execute()
+            .limit(10))
         
         quizzes = []
         for quiz in quizzes_response.data:
             # Fetch questions for this quiz
-            questions_response = supabase.table("quiz_questions") \
+            questions_response = await execute(db().table("quiz_questions") \
                 .select("*") \
-                .eq("quiz_id", quiz['id']) \
-                .execute()
+                .eq("quiz_id", quiz['id']))
             
             quiz['questions'] = questions_response.data
             quizzes.append(quiz)
@@ -7,17 +7,10 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
 from services.roadmap_generation import generate_roadmap, get_document_context
-from supabase import create_client
-import os
+from database import db, execute
 
 router = APIRouter(prefix="/roadmap", tags=["roadmap"])
 
-# Supabase client
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-
 class GenerateRoadmapRequest(BaseModel):
     skill_id: str
     document_ids: Optional[List[str]] = []
@@ -37,7 +30,7 @@ async def generate_skill_roadmap(request: GenerateRoadmapRequest):
     """
     try:
         # Fetch skill details
-        skill_response = supabase.table('skills').select('*').eq('id', request.skill_id).single().execute()
+        skill_response = await execute(db().table('skills').select('*').eq('id', request.skill_id).single())
         
         if not skill_response.data:
             raise HTTPException(status_code=404, detail="Skill not found")
@@ -50,7 +43,7 @@ async def generate_skill_roadmap(request: GenerateRoadmapRequest):
             document_context = await get_document_context(request.document_ids)
         
         # Generate roadmap
-        roadmap_text, roadmap_svg = generate_roadmap(
+        roadmap_text, roadmap_svg = await generate_roadmap(
             skill_title=skill['title'],
             description=skill.get('description', ''),
             category=skill.get('category', 'general'),
@@ -59,10 +52,10 @@ async def generate_skill_roadmap(request: GenerateRoadmapRequest):
         )
         
         # Update skill with roadmap
-        update_response = supabase.table('skills').update({
+        update_response = await execute(db().table('skills').update({
             'roadmap': roadmap_text,
             'roadmap_svg': roadmap_svg
-        }).eq('id', request.skill_id).execute()
+        }).eq('id', request.skill_id))
         
         return {
             "success": True,
@@ -91,7 +84,7 @@ async def get_skill_roadmap(skill_id: str):
         Roadmap data
     """
     try:
-        response = supabase.table('skills').select('roadmap, roadmap_svg').eq('id', skill_id).single().execute()
+        response = await execute(db().table('skills').select('roadmap, roadmap_svg').eq('id', skill_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Skill not found")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from database import supabase
+from database import db, execute
 
 router = APIRouter(prefix="/skills", tags=["skills"])
 
@@ -19,7 +19,7 @@ async def delete_skill(skill_id: str):
     try:
         # Verify skill exists and delete it
         # RLS policy ensures user can only delete their own skills
-        response = supabase.table("skills").delete().eq("id", skill_id).execute()
+        response = await execute(db().table("skills").delete().eq("id", skill_id))
         
         # Check if any rows were deleted
         if not response.data or len(response.data) == 0:
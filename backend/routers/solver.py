@@ -1,16 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from database import supabase
+from database import db, execute, http
 from rag import rag_service
+from services.llm_client import invoke_llm
 from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Optional, Any
-import requests
 import json
 import os
 import re
 
 router = APIRouter(prefix="/solver", tags=["solver"])
 
+CODE_RUNNER_URL = os.environ.get("CODE_RUNNER_URL", "http://code_runner:8001/run")
+CODE_RUNNER_TIMEOUT = float(os.environ.get("CODE_RUNNER_TIMEOUT", "10"))
+
 # Initialize Gemini
 llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
 
@@ -29,17 +32,8 @@ class SubmitCodeRequest(BaseModel):
 async def generate_question(payload: GenerateQuestionRequest):
     try:
         # 1. RAG Context (Optional but helpful)
-        query_embedding = rag_service.model.encode(payload.topic).tolist()
-        params = {
-            "query_embedding": query_embedding,
-            "match_threshold": 0.3,
-            "match_count": 3,
-            "filter_skill_id": payload.skill_id
-        }
-        # Assuming match_documents RPC exists and works (reusing from chat)
         try:
-            response = supabase.rpc("match_documents", params).execute()
-            matches = response.data
+            matches = await rag_service.match_documents(payload.topic, payload.skill_id, match_count=3, match_threshold=0.3)
             context_text = "\n\n".join([match['content'] for match in matches]) if matches else ""
         except:
             context_text = ""
@@ -63,26 +57,8 @@ async def generate_question(payload: GenerateQuestionRequest):
         user_prompt = f"Topic: {payload.topic}\nDifficulty: {payload.difficulty}\nContext: {context_text}"
         
         # Invoke LLM
-        ai_response = llm.invoke(f"{system_prompt}\n\n{user_prompt}")
-        content = ai_response.content
-        print(f"DEBUG: Raw content type: {type(content)}")
+        content = await invoke_llm(llm, f"{system_prompt}\n\n{user_prompt}")
         print(f"DEBUG: Raw content: {content}")
-        
-        if not isinstance(content, str):
-            if isinstance(content, list):
-                # Handle list of content blocks (e.g. [{'type': 'text', 'text': '...'}])
-                extracted = []
-                for part in content:
-                    if isinstance(part, dict) and 'text' in part:
-                        extracted.append(part['text'])
-                    elif isinstance(part, str):
-                        extracted.append(part)
-                content = "".join(extracted)
-            elif hasattr(content, 'parts'):
-                 # Handle case where content might be a list of parts (Gemini specific)
-                 content = "".join([part.text for part in content.parts])
-            else:
-                content = str(content)
 
         # Clean JSON (Gemini sometimes wraps in ```json ... ```)
         content = re.sub(r"```json\s*", "", content)
@@ -103,7 +79,7 @@ async def generate_question(payload: GenerateQuestionRequest):
             "description": data.get("description", "No description"),
             "difficulty": data.get("difficulty", payload.difficulty)
         }
-        q_res = supabase.table("coding_questions").insert(q_data).execute()
+        q_res = await execute(db().table("coding_questions").insert(q_data))
         question_id = q_res.data[0]['id']
         
         # Save Test Cases
@@ -118,7 +94,7 @@ async def generate_question(payload: GenerateQuestionRequest):
             })
         
         if tc_records:
-            supabase.table("test_cases").insert(tc_records).execute()
+            await execute(db().table("test_cases").insert(tc_records))
             
         return {
             "status": "success",
@@ -137,7 +113,7 @@ async def generate_question(payload: GenerateQuestionRequest):
 async def submit_code(payload: SubmitCodeRequest):
     try:
         # 1. Fetch Test Cases
-        tc_res = supabase.table("test_cases").select("*").eq("question_id", payload.question_id).execute()
+        tc_res = await execute(db().table("test_cases").select("*").eq("question_id", payload.question_id))
         test_cases = tc_res.data
         
         if not test_cases:
@@ -148,16 +124,14 @@ async def submit_code(payload: SubmitCodeRequest):
         passed_count = 0
         overall_status = "passed"
         
-        CODE_RUNNER_URL = os.environ.get("CODE_RUNNER_URL", "http://code_runner:8001/run")
-        
         for tc in test_cases:
             try:
                 # Call Code Runner Service
-                response = requests.post(CODE_RUNNER_URL, json={
+                response = await http().post(CODE_RUNNER_URL, json={
                     "code": payload.code,
                     "input_data": tc['input'],
                     "language": payload.language
-                }, timeout=10)
+                }, timeout=CODE_RUNNER_TIMEOUT)
                 
                 if response.status_code != 200:
                     res_data = {"status": "error", "output": "Runner Error"}
@@ -212,12 +186,12 @@ async def submit_code(payload: SubmitCodeRequest):
             "status": overall_status,
             "output": json.dumps(results) # Store detailed results
         }
-        supabase.table("code_submissions").insert(sub_data).execute()
+        await execute(db().table("code_submissions").insert(sub_data))
         
         # 4. Log to Analytics (Progress Metrics)
         try:
             # Fetch skill_id for this question
-            q_info = supabase.table("coding_questions").select("skill_id").eq("id", payload.question_id).single().execute()
+            q_info = await execute(db().table("coding_questions").select("skill_id").eq("id", payload.question_id).single())
             skill_id = q_info.data['skill_id'] if q_info.data else None
             
             if skill_id:
@@ -233,7 +207,7 @@ async def submit_code(payload: SubmitCodeRequest):
                         "language": payload.language
                     }
                 }
-                supabase.table("progress_metrics").insert(analytics_data).execute()
+                await execute(db().table("progress_metrics").insert(analytics_data))
         except Exception as log_error:
             print(f"Failed to log analytics: {log_error}")
 
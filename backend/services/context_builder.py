@@ -0,0 +1,128 @@
+"""
+Prompt context assembly for retrieved chunks.
+
+Chunks are split with a 200-character overlap, so neighbours returned by
+the same search repeat part of each other's text. build_context stitches
+chunks of the same document with consecutive chunk_index values back
+into one passage (dropping the overlap), removes passages that are
+near-duplicates of a better-ranked one (e.g. the same slide uploaded
+twice), and packs passages in relevance order into a token budget.
+"""
+
+import os
+import re
+
+# Rough budget for the retrieved part of the prompt; ~4 characters per token for English
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "1500"))
+CHARS_PER_TOKEN = 4
+# Longest overlap searched for when stitching neighbours (splitter overlap + slack)
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+DUPLICATE_SIMILARITY = 0.8
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _join(left: str, right: str) -> str:
+    size = _overlap(left, right)
+    if size:
+        return left + right[size:]
+    return left.rstrip() + "\n" + right.lstrip()
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _covered(candidate: set, kept: set) -> bool:
+    """True when most of the candidate's word 3-grams already appear in a kept passage."""
+    if not candidate or not kept:
+        return False
+    return len(candidate & kept) / len(candidate) >= DUPLICATE_SIMILARITY
+
+
+def merge_adjacent(matches):
+    """
+    Groups matches into passages: runs of consecutive chunk_index within a document
+    become one passage. Returns [(rank, text)] where rank is the best (lowest)
+    position of any member in `matches`.
+    """
+    passages = []
+    positioned = {}
+    for rank, match in enumerate(matches):
+        document_id, chunk_index = match.get("document_id"), match.get("chunk_index")
+        if document_id is None or chunk_index is None:
+            passages.append((rank, match["content"]))
+            continue
+        # Keep the first (best-ranked) copy if a chunk comes back twice
+        positioned.setdefault((document_id, chunk_index), (rank, match["content"]))
+
+    run = None
+    ordered = sorted(positioned.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+    for (document_id, chunk_index), (rank, content) in ordered:
+        if run and run["document_id"] == document_id and run["last"] + 1 == chunk_index:
+            run["text"] = _join(run["text"], content)
+            run["rank"] = min(run["rank"], rank)
+            run["last"] = chunk_index
+            continue
+        if run:
+            passages.append((run["rank"], run["text"]))
+        run = {"document_id": document_id, "last": chunk_index, "rank": rank, "text": content}
+    if run:
+        passages.append((run["rank"], run["text"]))
+
+    passages.sort(key=lambda passage: passage[0])
+    return passages
+
+
+def build_context(matches, max_tokens: int = None, separator: str = "\n\n") -> str:
+    """
+    Builds the context block for a prompt from match_documents rows
+    (best first; document_id and chunk_index are used when present).
+    """
+    if max_tokens is None:
+        max_tokens = CONTEXT_MAX_TOKENS
+    if not matches:
+        return ""
+
+    kept, seen = [], []
+    for _, text in merge_adjacent(matches):
+        shingles = _shingles(text)
+        if any(_covered(shingles, other) for other in seen):
+            continue
+        seen.append(shingles)
+        kept.append(text.strip())
+
+    parts, used = [], 0
+    separator_tokens = estimate_tokens(separator)
+    for text in kept:
+        cost = estimate_tokens(text) + (separator_tokens if parts else 0)
+        if used + cost <= max_tokens:
+            parts.append(text)
+            used += cost
+        elif not parts:
+            # Even the best passage is over budget: keep its beginning, cut at a word boundary
+            limit = max_tokens * CHARS_PER_TOKEN
+            parts.append(text[:limit].rsplit(" ", 1)[0])
+            break
+
+    raw = sum(len(match["content"]) for match in matches)
+    context = separator.join(parts)
+    print(f"Context: {len(matches)} chunks -> {len(parts)} passages, {raw} -> {len(context)} chars")
+    return context
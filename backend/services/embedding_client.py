@@ -0,0 +1,56 @@
+"""
+Embedding Client
+Calls the shared embedder sidecar (embedder/) instead of loading a model per API process
+"""
+
+import os
+import httpx
+import numpy as np
+
+EMBEDDING_SERVICE_URL = os.getenv('EMBEDDING_SERVICE_URL')
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv('EMBEDDING_SERVICE_TIMEOUT', '10'))
+# Must not exceed the sidecar's EMBEDDER_MAX_TEXTS_PER_REQUEST; larger inputs are sent in parts
+EMBEDDING_SERVICE_MAX_TEXTS = int(os.getenv('EMBEDDING_SERVICE_MAX_TEXTS', '256'))
+
+
+class RemoteEncoder:
+    """
+    Drop-in for SentenceTransformer.encode backed by the embedder service.
+    The sidecar coalesces concurrent requests from all API processes into shared batches.
+    model_id is the model the sidecar reports it actually runs (its backend may have
+    fallen back to torch), None until it has been reached.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        # One pooled keep-alive client per process, shared by all requests
+        self.client = httpx.Client(
+            base_url=self.base_url,
+            timeout=EMBEDDING_SERVICE_TIMEOUT,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+        self._model_id = None
+
+    @property
+    def model_id(self):
+        if self._model_id is None:
+            try:
+                response = self.client.get('/health')
+                response.raise_for_status()
+                self._model_id = response.json().get('model')
+            except Exception as e:
+                print(f"Embedder not reachable for model id: {e}")
+        return self._model_id
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        parts = []
+        for i in range(0, len(texts), EMBEDDING_SERVICE_MAX_TEXTS):
+            response = self.client.post('/embed', json={'texts': texts[i:i + EMBEDDING_SERVICE_MAX_TEXTS]})
+            response.raise_for_status()
+            body = response.json()
+            self._model_id = body.get('model') or self._model_id
+            parts.append(np.asarray(body['embeddings'], dtype=np.float32))
+        vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        return vectors[0] if single else vectors
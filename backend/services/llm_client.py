@@ -0,0 +1,91 @@
+"""
+LLM Client Helpers
+Runs LLM calls on the event loop without blocking it, capped per process
+"""
+
+import asyncio
+import os
+from typing import Any
+
+# At most this many LLM calls (including streams) run at once per process; the rest wait
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '120'))
+
+_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_stats = {"in_flight": 0, "waiting": 0, "completed": 0}
+
+
+def message_text(content: Any) -> str:
+    """
+    Flattens LangChain/Gemini message content into plain text
+    (Gemini sometimes returns a list of parts instead of a string)
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        extracted = []
+        for part in content:
+            if isinstance(part, dict) and 'text' in part:
+                extracted.append(part['text'])
+            elif isinstance(part, str):
+                extracted.append(part)
+        return "".join(extracted)
+    if hasattr(content, 'parts'):
+        return "".join([part.text for part in content.parts])
+    return str(content)
+
+
+class LLMSlot:
+    """
+    Async context manager holding one of the LLM_MAX_CONCURRENCY slots
+    """
+
+    async def __aenter__(self):
+        _stats["waiting"] += 1
+        try:
+            await _slots.acquire()
+        finally:
+            _stats["waiting"] -= 1
+        _stats["in_flight"] += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        _stats["in_flight"] -= 1
+        _stats["completed"] += 1
+        _slots.release()
+        return False
+
+
+def llm_stats() -> dict:
+    return {"max_concurrency": LLM_MAX_CONCURRENCY, **_stats}
+
+
+async def invoke_llm(llm: Any, prompt: str) -> str:
+    """
+    Non-blocking replacement for llm.invoke(prompt).content on LangChain chat models
+    
+    Args:
+        llm: LangChain chat model
+        prompt: Full prompt text
+        
+    Returns:
+        Response text
+    """
+    async with LLMSlot():
+        response = await asyncio.wait_for(llm.ainvoke(prompt), LLM_TIMEOUT)
+    return message_text(response.content)
+
+
+async def generate_content(model: Any, prompt: str) -> Any:
+    """
+    Non-blocking model.generate_content(prompt) for google.generativeai models
+    
+    Args:
+        model: genai.GenerativeModel
+        prompt: Full prompt text
+        
+    Returns:
+        The Gemini response object
+    """
+    async with LLMSlot():
+        return await asyncio.wait_for(model.generate_content_async(prompt), LLM_TIMEOUT)
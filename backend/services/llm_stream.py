@@ -0,0 +1,122 @@
+"""
+LLM Streaming Helpers
+Streams LLM answers as Server-Sent Events
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
+
+from services.llm_client import LLMSlot, message_text
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formats one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Headers that keep proxies (nginx, etc.) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+# Saves still running for streams whose client went away (kept so they aren't garbage collected)
+_background_saves = set()
+
+
+async def _complete(on_complete, content: str):
+    result = on_complete(content)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _save_in_background(on_complete, generation: asyncio.Task, parts: list) -> asyncio.Task:
+    async def save():
+        # Let the cancelled generation unwind (and give its slot back) first
+        await asyncio.gather(generation, return_exceptions=True)
+        try:
+            await _complete(on_complete, "".join(parts))
+        except Exception as e:
+            print(f"Stream Save Error: {e}")
+
+    task = asyncio.ensure_future(save())
+    _background_saves.add(task)
+    task.add_done_callback(_background_saves.discard)
+    return task
+
+
+async def stream_llm_events(
+    llm: Any,
+    prompt: str,
+    first_event: dict,
+    on_complete: Callable[[str], Union[Optional[dict], Awaitable[Optional[dict]]]],
+) -> AsyncIterator[str]:
+    """
+    Streams an LLM answer as SSE events:
+    - "sources": `first_event` (chat id, retrieved sources), sent before the LLM is called
+    - "token": {"text": ...} for every chunk from llm.astream()
+    - "done": whatever on_complete(full_text) returns, once the answer has been saved
+    - "error": {"detail": ...} if generation or saving fails
+
+    Generation runs in its own task that holds the LLM slot only until the
+    model is done, so a slow client doesn't keep a slot busy. If the client
+    disconnects, generation is stopped and on_complete still runs with the
+    partial answer, so the exchange isn't lost.
+
+    Args:
+        llm: LangChain chat model (anything with astream)
+        prompt: Full prompt text
+        first_event: Payload of the leading "sources" event
+        on_complete: Called with the full answer after the last token (sync or async)
+    """
+    yield sse_event("sources", first_event)
+
+    start = time.perf_counter()
+    first_token = None
+    parts = []
+    tokens = asyncio.Queue()
+
+    async def generate():
+        try:
+            async with LLMSlot():
+                async for chunk in llm.astream(prompt):
+                    text = message_text(chunk.content)
+                    if text:
+                        parts.append(text)
+                        tokens.put_nowait(text)
+        finally:
+            tokens.put_nowait(None)
+
+    generation = asyncio.ensure_future(generate())
+    save, failed = None, False
+    try:
+        while (text := await tokens.get()) is not None:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield sse_event("token", {"text": text})
+        await generation
+
+        # Shielded: a disconnect while saving must not cancel the save
+        save = asyncio.ensure_future(_complete(on_complete, "".join(parts)))
+        result = await asyncio.shield(save)
+        yield sse_event("done", result or {})
+    except Exception as e:
+        failed = True
+        print(f"Stream Error: {e}")
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        # Client went away before the save started: stop generating and save what there is
+        if save is None and not failed:
+            generation.cancel()
+            _save_in_background(on_complete, generation, parts)
+        elif save is not None and not save.done():
+            _background_saves.add(save)
+            save.add_done_callback(_background_saves.discard)
+        if first_token is not None:
+            total = time.perf_counter() - start
+            print(f"Stream: first token after {first_token * 1000:.0f} ms, complete after {total * 1000:.0f} ms")
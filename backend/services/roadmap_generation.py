@@ -3,10 +3,13 @@ Roadmap Generation Service
 Uses Gemini AI to generate personalized learning roadmaps
 """
 
+import asyncio
 import google.generativeai as genai
 import os
 from typing import Optional, List
 from services.roadmap_visualization import generate_roadmap_svg, extract_phases_from_roadmap
+from services.llm_client import generate_content
+from database import db, execute
 
 
 # Configure Gemini
@@ -14,7 +17,7 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 genai.configure(api_key=GEMINI_API_KEY)
 
 
-def generate_roadmap(
+async def generate_roadmap(
     skill_title: str,
     description: str,
     category: str,
@@ -101,7 +104,7 @@ Format in clean Markdown with headers and bullet points. Be specific and actiona
     try:
         # Generate roadmap with Gemini
         model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt)
+        response = await generate_content(model, prompt)
         roadmap_text = response.text
         
         # Extract phases for SVG generation
@@ -193,24 +196,19 @@ async def get_document_context(document_ids: List[str]) -> Optional[str]:
         return None
     
     try:
-        from supabase import create_client
-        import os
+        # Retrieve chunks for the provided document IDs (one concurrent query per document)
+        # Limit to first 20 chunks per document to avoid token overflow
+        responses = await asyncio.gather(*[
+            execute(db().table('document_chunks')
+                .select('content, chunk_index')
+                .eq('document_id', doc_id)
+                .order('chunk_index')
+                .limit(20))
+            for doc_id in document_ids
+        ])
         
-        # Initialize Supabase client
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # Retrieve chunks for the provided document IDs
         all_chunks = []
-        for doc_id in document_ids:
-            response = supabase.table('document_chunks')\
-                .select('content, chunk_index')\
-                .eq('document_id', doc_id)\
-                .order('chunk_index')\
-                .limit(20)\
-                .execute()  # Limit to first 20 chunks per document to avoid token overflow
-            
+        for response in responses:
             if response.data:
                 all_chunks.extend([chunk['content'] for chunk in response.data])
         
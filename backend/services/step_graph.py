@@ -0,0 +1,92 @@
+"""
+Step Graph
+Runs the steps of a request as a dependency graph: every step starts as soon
+as the steps it depends on have finished, so independent database calls and
+retrieval overlap instead of running one after another.
+
+Each run logs per-step durations next to the wall time and the sequential
+sum, so the latency saved by overlapping is visible; step_stats() keeps the
+running averages for /health.
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Dict, Sequence
+
+_stats: Dict[str, dict] = {}
+
+
+class StepGraph:
+    def __init__(self, name: str):
+        self.name = name
+        self._steps = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> "StepGraph":
+        """
+        Adds a step. `fn` is called with the results of `deps` (in that order) and
+        may be sync or async. Dependencies must already be added, which keeps the
+        graph acyclic.
+        """
+        if name in self._steps:
+            raise ValueError(f"Step '{name}' already added to graph '{self.name}'")
+        missing = [dep for dep in deps if dep not in self._steps]
+        if missing:
+            raise ValueError(f"Step '{name}' depends on unknown steps {missing}")
+        self._steps[name] = (fn, tuple(deps))
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Runs all steps and returns {step name: result}. The first failure cancels the rest."""
+        tasks = {}
+
+        async def run_step(name):
+            fn, deps = self._steps[name]
+            args = [await tasks[dep] for dep in deps]
+            start = time.perf_counter()
+            result = fn(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            self.timings[name] = time.perf_counter() - start
+            return result
+
+        start = time.perf_counter()
+        for name in self._steps:
+            tasks[name] = asyncio.ensure_future(run_step(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        self._record(time.perf_counter() - start)
+        return {name: task.result() for name, task in tasks.items()}
+
+    def _record(self, wall: float):
+        sequential = sum(self.timings.values())
+        steps = ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in self.timings.items())
+        print(f"Steps [{self.name}]: {steps} ms | wall {wall * 1000:.0f} ms, "
+              f"sequential {sequential * 1000:.0f} ms, saved {(sequential - wall) * 1000:.0f} ms")
+
+        stats = _stats.setdefault(self.name, {"runs": 0, "wall": 0.0, "saved": 0.0, "steps": {}})
+        stats["runs"] += 1
+        stats["wall"] += wall
+        stats["saved"] += sequential - wall
+        for name, seconds in self.timings.items():
+            stats["steps"][name] = stats["steps"].get(name, 0.0) + seconds
+
+
+def step_stats() -> dict:
+    """Average milliseconds per graph: wall time, time saved by overlap, and each step."""
+    report = {}
+    for name, stats in _stats.items():
+        runs = stats["runs"]
+        report[name] = {
+            "runs": runs,
+            "avg_wall_ms": round(stats["wall"] / runs * 1000, 1),
+            "avg_saved_ms": round(stats["saved"] / runs * 1000, 1),
+            "avg_step_ms": {step: round(total / runs * 1000, 1) for step, total in stats["steps"].items()},
+        }
+    return report
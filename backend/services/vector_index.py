@@ -0,0 +1,372 @@
+"""
+In-process vector index per skill.
+
+A skill usually has only a few thousand chunks, so instead of a
+match_documents round trip per question the backend keeps each hot
+skill's chunk embeddings in memory as a normalized float32 matrix and
+answers with one matrix-vector product. Skills are loaded lazily on
+first search and evicted least-recently-used once the memory budget
+(VECTOR_INDEX_MAX_MB) is exceeded.
+
+A skill's entry is dropped when a document of that skill becomes ready
+or is deleted: the documents trigger in phase11_document_ready_notify.sql
+sends a 'document_ready' NOTIFY that a listener thread picks up (needs
+DATABASE_URL). While no LISTEN connection is up, every search first reads
+the skill's chunks_version (phase21_skill_chunks_version.sql, bumped on the
+same events) and reloads the skill if it moved. Entries also expire after
+VECTOR_INDEX_TTL seconds as a last resort.
+"""
+
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+NOTIFY_CHANNEL = "document_ready"
+
+
+class SkillIndex:
+    def __init__(self, ids, positions, contents, matrix, version=None):
+        self.ids = ids
+        self.positions = positions
+        self.contents = contents
+        self.matrix = matrix
+        # skills.chunks_version read before the chunks (None if unavailable)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.nbytes = matrix.nbytes + sum(len(c) for c in contents)
+        self.rows_by_id = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    def _row(self, i, scores):
+        return {
+            "id": self.ids[i],
+            "document_id": self.positions[i][0],
+            "chunk_index": self.positions[i][1],
+            "content": self.contents[i],
+            "similarity": float(scores[i]),
+        }
+
+    @staticmethod
+    def _top(scores, count: int):
+        count = min(count, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query, match_count: int, match_threshold: float):
+        """Same rows as match_documents: cosine similarity above the threshold, best first."""
+        if not self.ids:
+            return []
+        scores = self.matrix @ query
+        return [self._row(i, scores) for i in self._top(scores, match_count) if scores[i] > match_threshold]
+
+    def fuse(self, query, lexical, match_count: int, match_threshold: float, rrf_k: int):
+        """
+        Same rows as match_documents_hybrid, with the vector side ranked here and the
+        lexical side from match_documents_lexical rows (id, rank_score, all_terms, term_count).
+        """
+        if not self.ids:
+            return []
+        scores = self.matrix @ query
+        lexical = [row for row in lexical if row["id"] in self.rows_by_id]
+
+        # Enough chunks contain every term of a multi-term query: lexical ranking alone, like the RPC
+        confident = [row for row in lexical if row["all_terms"]]
+        if lexical and lexical[0].get("term_count", 0) >= 2 and len(confident) >= match_count:
+            confident.sort(key=lambda row: -row["rank_score"])
+            return [
+                dict(self._row(self.rows_by_id[row["id"]], scores), score=row["rank_score"])
+                for row in confident[:match_count]
+            ]
+
+        candidates = match_count * 4
+        lexical.sort(key=lambda row: -row["rank_score"])
+        lexical_rank = {row["id"]: rank for rank, row in enumerate(lexical[:candidates], start=1)}
+        semantic_rank = {self.ids[i]: rank for rank, i in enumerate(self._top(scores, candidates), start=1)}
+
+        fused = {}
+        for ranks in (lexical_rank, semantic_rank):
+            for chunk_id, rank in ranks.items():
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+
+        rows = []
+        for chunk_id, score in sorted(fused.items(), key=lambda item: -item[1]):
+            i = self.rows_by_id[chunk_id]
+            # Vector-only candidates must still pass the threshold; lexical hits always count
+            if chunk_id not in lexical_rank and scores[i] <= match_threshold:
+                continue
+            rows.append(dict(self._row(i, scores), score=score))
+            if len(rows) == match_count:
+                break
+        return rows
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _parse_vector(value):
+    # PostgREST returns pgvector columns in their text form, "[0.1,0.2,...]"
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorIndex:
+    def __init__(self, supabase, max_bytes: int = None, ttl: float = None,
+                 max_chunks: int = None, page_size: int = 1000, dsn: str = None,
+                 retry_after: float = None):
+        self.supabase = supabase
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("VECTOR_INDEX_MAX_MB", "256")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.ttl = ttl if ttl is not None else float(os.environ.get("VECTOR_INDEX_TTL", "60"))
+        # Skills bigger than this stay on the match_documents RPC
+        self.max_chunks = max_chunks or int(os.environ.get("VECTOR_INDEX_MAX_CHUNKS", "50000"))
+        self.page_size = page_size
+        # A skill whose load failed goes to the RPC for this long before loading is retried
+        self.retry_after = retry_after if retry_after is not None else float(os.environ.get("VECTOR_INDEX_RETRY_AFTER", "30"))
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._skills = OrderedDict()
+        self._too_large = {}
+        self._failed = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        # Bumped on invalidation, so a load racing with a NOTIFY isn't cached
+        self._versions = {}
+        # Set while the LISTEN connection is up; otherwise searches check chunks_version
+        self._listening = threading.Event()
+
+        dsn = dsn if dsn is not None else os.environ.get("DATABASE_URL")
+        if dsn:
+            threading.Thread(target=self._listen, args=(dsn,), daemon=True).start()
+
+    def stats(self) -> dict:
+        return {
+            "skills": len(self._skills),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "invalidation": "listen" if self._listening.is_set() else "version check",
+        }
+
+    def search(self, skill_id: str, query_embedding, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        Top matches for a skill, or None when the skill isn't served from memory
+        (too many chunks, or loading failed) and the caller should use the RPC.
+        A request without a skill has nothing to search.
+        """
+        if not skill_id:
+            return []
+        index = self._get(skill_id)
+        if index is None:
+            return None
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        return index.search(query, match_count, match_threshold)
+
+    def search_many(self, skill_id: str, query_embeddings, match_count: int = 5, match_threshold: float = 0.3):
+        """
+        search() for several queries at once, like the match_documents_multi RPC:
+        a chunk matched by more than one query is kept only under the best one.
+        """
+        if not skill_id:
+            return [[] for _ in query_embeddings]
+        index = self._get(skill_id)
+        if index is None:
+            return None
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        results = [index.search(query, match_count, match_threshold) for query in queries]
+        best = {}
+        for position, matches in enumerate(results):
+            for match in matches:
+                if match["id"] not in best or match["similarity"] > best[match["id"]][1]:
+                    best[match["id"]] = (position, match["similarity"])
+        return [
+            [match for match in matches if best[match["id"]][0] == position]
+            for position, matches in enumerate(results)
+        ]
+
+    def serves(self, skill_id: str) -> bool:
+        """True when the skill is (or can now be loaded) in memory; loads it if needed."""
+        return bool(skill_id) and self._get(skill_id) is not None
+
+    def hybrid_search(self, skill_id: str, query_embedding, lexical, match_count: int = 5,
+                      match_threshold: float = 0.3, rrf_k: int = 60):
+        """
+        In-memory counterpart of the match_documents_hybrid RPC, given the rows of
+        match_documents_lexical. None when the skill isn't served from memory.
+        """
+        index = self._get(skill_id)
+        if index is None:
+            return None
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        return index.fuse(query, lexical, match_count, match_threshold, rrf_k)
+
+    def invalidate(self, skill_id: str):
+        with self._lock:
+            index = self._skills.pop(skill_id, None)
+            self._too_large.pop(skill_id, None)
+            self._failed.pop(skill_id, None)
+            self._versions[skill_id] = self._versions.get(skill_id, 0) + 1
+            if index is not None:
+                self._bytes -= index.nbytes
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _chunks_version(self, skill_id: str):
+        """The skill's chunks_version, or None if it can't be read (e.g. before phase 21)."""
+        try:
+            response = self.supabase.table("skills").select("chunks_version").eq("id", skill_id).limit(1).execute()
+        except Exception as e:
+            print(f"Vector index version check failed for skill {skill_id}: {e}")
+            return None
+        rows = response.data or []
+        return rows[0].get("chunks_version") if rows else None
+
+    def _current(self, skill_id: str, index) -> bool:
+        if index is None or not self._fresh(index.loaded_at):
+            return False
+        if self._listening.is_set() or index.version is None:
+            return True
+        # No NOTIFY can reach us: one primary-key read instead of trusting the TTL
+        if self._chunks_version(skill_id) == index.version:
+            return True
+        self.invalidate(skill_id)
+        return False
+
+    def _get(self, skill_id: str):
+        with self._lock:
+            index = self._skills.get(skill_id)
+        if self._current(skill_id, index):
+            with self._lock:
+                if skill_id in self._skills:
+                    self._skills.move_to_end(skill_id)
+                self.hits += 1
+            return index
+
+        with self._lock:
+            if skill_id in self._too_large and self._fresh(self._too_large[skill_id]):
+                return None
+            if skill_id in self._failed and time.monotonic() - self._failed[skill_id] < self.retry_after:
+                return None
+            load_lock = self._load_locks.setdefault(skill_id, threading.Lock())
+
+        # One load per skill; concurrent requests wait for it instead of stampeding the database
+        with load_lock:
+            with self._lock:
+                index = self._skills.get(skill_id)
+                if index is not None and self._fresh(index.loaded_at):
+                    return index
+                version = self._versions.get(skill_id, 0)
+            try:
+                index = self._load(skill_id)
+            except Exception as e:
+                print(f"Vector index load failed for skill {skill_id}: {e}")
+                with self._lock:
+                    self._failed[skill_id] = time.monotonic()
+                return None
+            finally:
+                with self._lock:
+                    self._load_locks.pop(skill_id, None)
+
+            with self._lock:
+                if version != self._versions.get(skill_id, 0):
+                    return index
+                if index is None:
+                    self._too_large[skill_id] = time.monotonic()
+                    return None
+                self._failed.pop(skill_id, None)
+                old = self._skills.pop(skill_id, None)
+                if old is not None:
+                    self._bytes -= old.nbytes
+                self._skills[skill_id] = index
+                self._bytes += index.nbytes
+                self.loads += 1
+                self._evict()
+            return index
+
+    def _evict(self):
+        # The newest entry is kept even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._skills) > 1:
+            _, index = self._skills.popitem(last=False)
+            self._bytes -= index.nbytes
+            self.evictions += 1
+
+    def _load(self, skill_id: str):
+        """Reads a skill's chunks page by page. Returns None if the skill has more than max_chunks."""
+        # Read first, so a document finishing mid-load shows up as a newer version
+        version = None if self._listening.is_set() else self._chunks_version(skill_id)
+        ids, positions, contents, vectors = [], [], [], []
+        start = 0
+        while True:
+            response = self.supabase.table("document_chunks") \
+                .select("id, document_id, chunk_index, content, embedding") \
+                .eq("skill_id", skill_id) \
+                .order("id") \
+                .range(start, start + self.page_size - 1) \
+                .execute()
+            rows = response.data or []
+            for row in rows:
+                if row.get("embedding") is None:
+                    continue
+                ids.append(row["id"])
+                positions.append((row["document_id"], row["chunk_index"]))
+                contents.append(row["content"])
+                vectors.append(_parse_vector(row["embedding"]))
+            if len(ids) > self.max_chunks:
+                return None
+            if len(rows) < self.page_size:
+                break
+            start += self.page_size
+
+        if vectors:
+            matrix = _normalize(np.vstack(vectors))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return SkillIndex(ids, positions, contents, matrix, version)
+
+    def _listen(self, dsn: str):
+        """Drops a skill's entry whenever the database reports a document of it changed."""
+        try:
+            import psycopg2
+        except ImportError:
+            print("psycopg2 not installed; vector index relies on VECTOR_INDEX_TTL only.")
+            return
+
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                # Anything may have changed while we weren't listening
+                self._listening.set()
+                for skill_id in list(self._skills):
+                    self.invalidate(skill_id)
+                backoff = 1.0
+                while True:
+                    if select.select([conn], [], [], 60)[0]:
+                        conn.poll()
+                        for notify in conn.notifies:
+                            if notify.payload:
+                                self.invalidate(notify.payload)
+                        conn.notifies.clear()
+            except Exception as e:
+                self._listening.clear()
+                print(f"Vector index LISTEN connection lost: {e}")
+                if conn is not None:
+                    conn.close()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
@@ -0,0 +1,41 @@
+"""
+Worker Wake-up
+Nudges the ingestion worker right after an upload
+"""
+
+import os
+import socket
+from typing import Optional
+
+# host:port of the worker's local wake-up channel (dev setups without LISTEN/NOTIFY).
+# With a direct Postgres connection the documents trigger notifies the worker instead.
+WORKER_WAKE_ADDR = os.getenv('WORKER_WAKE_ADDR')
+
+
+def _parse_addr(addr: str) -> Optional[tuple[str, int]]:
+    host, _, port = addr.rpartition(':')
+    if not host or not port.isdigit():
+        return None
+    return host, int(port)
+
+
+def notify_worker(document_id: str) -> None:
+    """
+    Best-effort wake-up; the worker still claims on its idle timeout if this is lost
+    
+    Args:
+        document_id: ID of the document that was just queued
+    """
+    if not WORKER_WAKE_ADDR:
+        return
+    
+    target = _parse_addr(WORKER_WAKE_ADDR)
+    if not target:
+        print(f"Invalid WORKER_WAKE_ADDR: {WORKER_WAKE_ADDR}")
+        return
+    
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(str(document_id).encode(), target)
+    except OSError as e:
+        print(f"Worker wake-up failed: {e}")
@@ -0,0 +1,102 @@
+-- Query plan and latency of match_documents at 1M chunks.
+-- Runs against a scratch schema so real data is untouched:
+--
+--   psql "$DATABASE_URL" -f database/benchmarks/match_documents_1m.sql
+--
+-- Loading 1M random 384-d vectors and building the HNSW index takes several
+-- minutes. Drop the schema afterwards with: DROP SCHEMA bench CASCADE;
+
+\timing on
+\set skills 500
+\set chunks 1000000
+
+CREATE SCHEMA IF NOT EXISTS bench;
+SET search_path = bench, public;
+SET maintenance_work_mem = '2GB';
+
+CREATE TABLE IF NOT EXISTS bench.documents (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  skill_id uuid NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bench.document_chunks (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  document_id uuid NOT NULL REFERENCES bench.documents ON DELETE CASCADE,
+  content text NOT NULL,
+  embedding vector(384)
+);
+
+-- 20 documents per skill, chunks spread evenly over documents
+INSERT INTO bench.documents (skill_id)
+SELECT skill FROM (SELECT gen_random_uuid() AS skill FROM generate_series(1, :skills)) s,
+  generate_series(1, 20)
+WHERE NOT EXISTS (SELECT 1 FROM bench.documents);
+
+-- (the WHERE n > 0 correlates the subquery so each row gets its own random vector)
+INSERT INTO bench.document_chunks (document_id, content, embedding)
+SELECT d.id, 'chunk ' || n,
+  (SELECT array_agg(random() - 0.5) FROM generate_series(1, 384) WHERE n > 0)::vector(384)
+FROM generate_series(1, :chunks) n
+JOIN (SELECT id, row_number() OVER () - 1 AS slot FROM bench.documents) d
+  ON d.slot = n % (:skills * 20)
+WHERE NOT EXISTS (SELECT 1 FROM bench.document_chunks);
+
+ANALYZE bench.documents;
+ANALYZE bench.document_chunks;
+
+-- A query vector and a skill to filter on
+SELECT embedding AS q FROM bench.document_chunks ORDER BY random() LIMIT 1 \gset
+SELECT skill_id AS skill FROM bench.documents ORDER BY random() LIMIT 1 \gset
+
+\echo '--- Before: threshold in WHERE, no vector index (sequential scan) ---'
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT c.id, c.content, 1 - (c.embedding <=> :'q') AS similarity
+FROM bench.document_chunks c
+JOIN bench.documents d ON c.document_id = d.id
+WHERE 1 - (c.embedding <=> :'q') > 0.3
+  AND d.skill_id = :'skill'
+ORDER BY c.embedding <=> :'q'
+LIMIT 5;
+
+CREATE INDEX IF NOT EXISTS bench_chunks_embedding_hnsw
+  ON bench.document_chunks USING hnsw (embedding vector_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+\echo '--- After: ORDER BY + LIMIT on the HNSW index, threshold applied afterwards ---'
+BEGIN;
+SELECT set_config('hnsw.ef_search', '40', true);
+-- Needs pgvector >= 0.8 (the pgvector/pgvector:pg15 image); drop this line on older versions
+SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true);
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT * FROM (
+  SELECT c.id, c.content, 1 - (c.embedding <=> :'q') AS similarity
+  FROM bench.document_chunks c
+  JOIN bench.documents d ON c.document_id = d.id
+  WHERE d.skill_id = :'skill'
+  ORDER BY c.embedding <=> :'q'
+  LIMIT 5
+) nearest
+WHERE nearest.similarity > 0.3
+ORDER BY nearest.similarity DESC;
+COMMIT;
+
+\echo '--- Recall vs. ef_search (unfiltered top 10 against exact search) ---'
+CREATE TEMP TABLE exact (id uuid);
+BEGIN;
+SET LOCAL enable_indexscan = off;
+INSERT INTO exact SELECT id FROM bench.document_chunks ORDER BY embedding <=> :'q' LIMIT 10;
+COMMIT;
+
+BEGIN;
+SELECT set_config('hnsw.ef_search', '40', true);
+SELECT count(*) / 10.0 AS recall_ef40 FROM (
+  SELECT id FROM bench.document_chunks ORDER BY embedding <=> :'q' LIMIT 10
+) approx WHERE id IN (SELECT id FROM exact);
+SELECT set_config('hnsw.ef_search', '100', true);
+SELECT count(*) / 10.0 AS recall_ef100 FROM (
+  SELECT id FROM bench.document_chunks ORDER BY embedding <=> :'q' LIMIT 10
+) approx WHERE id IN (SELECT id FROM exact);
+SELECT set_config('hnsw.ef_search', '200', true);
+SELECT count(*) / 10.0 AS recall_ef200 FROM (
+  SELECT id FROM bench.document_chunks ORDER BY embedding <=> :'q' LIMIT 10
+) approx WHERE id IN (SELECT id FROM exact);
+COMMIT;
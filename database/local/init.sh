@@ -0,0 +1,22 @@
+#!/bin/sh
+# Applies the database/ migrations to the compose `db` service on its first
+# start (mounted into /docker-entrypoint-initdb.d, with database/ itself at
+# /migrations). Files run in dependency order rather than the alphabetical
+# order the entrypoint would use, after the Supabase schema stand-ins.
+set -e
+cd /migrations
+
+run() {
+  echo "Applying $1"
+  psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" -f "$1"
+}
+
+run local/supabase_stubs.sql
+for file in schema.sql policies.sql policies_chat.sql policies_quiz.sql functions.sql functions_update.sql; do
+  run "$file"
+done
+for file in $(ls phase*_*.sql | sort -V); do
+  run "$file"
+done
+run create_quiz_questions.sql
+run add_roadmap_columns.sql
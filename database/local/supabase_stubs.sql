@@ -0,0 +1,50 @@
+-- Minimal stand-ins for the Supabase-managed schemas the migrations refer to
+-- (auth.users, auth.uid()/auth.role(), storage.objects), so they apply to the
+-- plain pgvector Postgres of the compose `db` service. Never run this against
+-- a Supabase project: there these schemas already exist.
+
+create schema if not exists auth;
+
+create table if not exists auth.users (
+  id uuid default gen_random_uuid() primary key,
+  email text,
+  raw_user_meta_data jsonb default '{}'::jsonb,
+  created_at timestamp with time zone default now()
+);
+
+-- Same claims PostgREST sets per request
+create or replace function auth.uid()
+returns uuid
+language sql
+stable
+as $$
+  select nullif(current_setting('request.jwt.claims', true)::jsonb ->> 'sub', '')::uuid
+$$;
+
+create or replace function auth.role()
+returns text
+language sql
+stable
+as $$
+  select current_setting('request.jwt.claims', true)::jsonb ->> 'role'
+$$;
+
+create schema if not exists storage;
+
+create table if not exists storage.buckets (
+  id text primary key,
+  name text not null,
+  public boolean default false
+);
+
+create table if not exists storage.objects (
+  id uuid default gen_random_uuid() primary key,
+  bucket_id text references storage.buckets,
+  name text,
+  owner uuid,
+  metadata jsonb,
+  created_at timestamp with time zone default now()
+);
+
+insert into storage.buckets (id, name, public) values ('documents', 'documents', true)
+on conflict (id) do nothing;
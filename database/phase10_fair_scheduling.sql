@@ -0,0 +1,85 @@
+-- Phase 10: Per-user fair scheduling of the ingestion queue
+-- One user bulk-uploading hundreds of PDFs should not delay everyone else.
+
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS file_size bigint;
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS queued_at timestamp with time zone DEFAULT now();
+
+-- queued_at restarts whenever a document (re-)enters the queue, e.g. on replace
+create or replace function set_document_queued_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.status = 'pending' and (tg_op = 'INSERT' or old.status is distinct from 'pending') then
+    new.queued_at := now();
+  end if;
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_document_queued ON public.documents;
+CREATE TRIGGER on_document_queued
+  BEFORE INSERT OR UPDATE OF status ON public.documents
+  FOR EACH ROW EXECUTE PROCEDURE set_document_queued_at();
+
+-- Weighted fair queuing: each user's pending documents get a virtual finish time equal
+-- to the cost (file size + fixed overhead) of everything that user has in flight plus
+-- their earlier pending documents. Claims go in finish-time order, so users take turns,
+-- and small documents (cheap) naturally jump ahead of a bulk upload.
+drop function if exists claim_documents(text, int, int, int);
+
+create or replace function claim_documents (
+  worker_id text,
+  batch_size int default 1,
+  lease_seconds int default 300,
+  max_attempts int default 3,
+  cost_overhead bigint default 262144
+)
+returns setof documents
+language plpgsql
+as $$
+begin
+  -- Jobs whose lease expired too many times are given up on
+  update documents
+  set status = 'failed',
+      error_message = 'Gave up after ' || documents.attempts || ' attempts (worker lease expired)',
+      locked_by = null,
+      lease_expires_at = null
+  where documents.status = 'processing'
+    and documents.lease_expires_at < now()
+    and documents.attempts >= max_attempts;
+
+  return query
+  update documents
+  set status = 'processing',
+      locked_by = worker_id,
+      lease_expires_at = now() + make_interval(secs => lease_seconds),
+      attempts = documents.attempts + 1
+  where documents.id in (
+    select d.id
+    from documents d
+    join (
+      select c.id,
+             coalesce(running.cost, 0)
+               + sum(coalesce(c.file_size, 0) + cost_overhead)
+                   over (partition by c.user_id order by c.queued_at, c.id) as finish
+      from documents c
+      left join (
+        select r.user_id, sum(coalesce(r.file_size, 0) + cost_overhead) as cost
+        from documents r
+        where r.status = 'processing' and r.lease_expires_at >= now()
+        group by r.user_id
+      ) running on running.user_id = c.user_id
+      where c.status = 'pending'
+         or (c.status = 'processing' and c.lease_expires_at < now())
+      order by finish
+      -- Head room for rows other workers have locked in the meantime
+      limit batch_size * 4
+    ) ranked on ranked.id = d.id
+    order by ranked.finish
+    limit batch_size
+    for update of d skip locked
+  )
+  returning documents.*;
+end;
+$$;
@@ -0,0 +1,27 @@
+-- Phase 11: Invalidation for the backend's in-memory vector index
+-- The backend LISTENs on 'document_ready' and drops the cached index of the
+-- notified skill whenever one of its documents finishes ingestion or is deleted.
+
+create or replace function notify_document_ready()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op = 'DELETE' then
+    if old.skill_id is not null then
+      perform pg_notify('document_ready', old.skill_id::text);
+    end if;
+    return old;
+  end if;
+
+  if new.status = 'ready' and new.skill_id is not null then
+    perform pg_notify('document_ready', new.skill_id::text);
+  end if;
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_document_ready ON public.documents;
+CREATE TRIGGER on_document_ready
+  AFTER UPDATE OF status OR DELETE ON public.documents
+  FOR EACH ROW EXECUTE PROCEDURE notify_document_ready();
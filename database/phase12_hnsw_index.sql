@@ -0,0 +1,84 @@
+-- Phase 12: Approximate nearest-neighbour index for document_chunks
+-- Requires pgvector >= 0.5 (HNSW). Building on a large table takes a while;
+-- raise maintenance_work_mem first so the graph is built in memory.
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_hnsw
+  ON public.document_chunks USING hnsw (embedding vector_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+-- Run before any search filtered to one skill. The filter is applied to the
+-- rows the HNSW scan returns, so on its own the global index can return fewer
+-- than match_count rows for a skill:
+-- - pgvector >= 0.8: hnsw.iterative_scan keeps walking the graph until enough
+--   rows pass the filter. (Older versions reserve the hnsw. prefix and reject
+--   unknown hnsw.* parameters, so it is only set where it exists.)
+-- - older pgvector: unless the skill has its own valid partial index
+--   (phase13_chunk_skill_id.sql), index scans are turned off for the
+--   transaction, so the search is an exact scan over the skill's rows.
+drop function if exists enable_hnsw_iterative_scan();
+
+create or replace function prepare_skill_vector_scan (filter_skill_id uuid)
+returns void
+language plpgsql
+as $$
+begin
+  if (
+    select string_to_array(extversion, '.')::int[] >= array[0, 8]
+    from pg_extension
+    where extname = 'vector'
+  ) then
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  elsif not exists (
+    select 1
+    from pg_index i
+    where i.indexrelid = to_regclass('public.idx_chunks_hnsw_' || replace(filter_skill_id::text, '-', ''))
+      and i.indisvalid
+  ) then
+    perform set_config('enable_indexscan', 'off', true);
+  end if;
+end;
+$$;
+
+-- match_documents, restructured so the planner can use the index:
+-- the inner query is a plain ORDER BY distance LIMIT (an index scan),
+-- and the similarity threshold is applied to those few rows afterwards.
+-- ef_search trades recall for latency (pgvector's default is 40).
+drop function if exists match_documents;
+
+create or replace function match_documents (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  content text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  -- Scoped to this call's transaction
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  -- Enough rows for the skill filter on any pgvector version
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query
+  select nearest.id, nearest.content, nearest.similarity
+  from (
+    select
+      document_chunks.id,
+      document_chunks.content,
+      1 - (document_chunks.embedding <=> query_embedding) as similarity
+    from document_chunks
+    join documents on document_chunks.document_id = documents.id
+    where documents.skill_id = filter_skill_id
+    order by document_chunks.embedding <=> query_embedding
+    limit match_count
+  ) nearest
+  where nearest.similarity > match_threshold
+  order by nearest.similarity desc;
+end;
+$$;
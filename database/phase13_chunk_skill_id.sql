@@ -0,0 +1,114 @@
+-- Phase 13: skill_id stored on document_chunks
+-- match_documents no longer joins documents for every query, and each skill's
+-- search only touches that skill's chunks (btree for small skills, a partial
+-- HNSW index per large skill).
+
+ALTER TABLE public.document_chunks
+  ADD COLUMN IF NOT EXISTS skill_id uuid REFERENCES public.skills(id) ON DELETE CASCADE;
+
+-- Backfill existing chunks (re-run safe)
+UPDATE public.document_chunks
+SET skill_id = documents.skill_id
+FROM public.documents
+WHERE document_chunks.document_id = documents.id
+  AND document_chunks.skill_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_skill ON public.document_chunks (skill_id);
+
+-- Writers set skill_id themselves; this only covers rows from older clients
+create or replace function set_chunk_skill_id()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.skill_id is null then
+    select documents.skill_id into new.skill_id
+    from documents
+    where documents.id = new.document_id;
+  end if;
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_chunk_insert_skill ON public.document_chunks;
+CREATE TRIGGER on_chunk_insert_skill
+  BEFORE INSERT ON public.document_chunks
+  FOR EACH ROW EXECUTE PROCEDURE set_chunk_skill_id();
+
+-- Partial HNSW index per large skill. Small skills are served by the btree on
+-- skill_id plus an exact sort, which already costs only that skill's chunk count.
+-- A plain CREATE INDEX would block writes to document_chunks for the whole build,
+-- and CREATE INDEX CONCURRENTLY can't run inside a function (or any transaction).
+-- So this only lists the missing indexes (rebuild = a failed concurrent build left
+-- an invalid one behind) with the statement to build each; backend/ensure_skill_indexes.py
+-- runs them. Run it periodically (e.g. from cron).
+drop function if exists ensure_skill_vector_indexes(int);
+
+create or replace function skill_vector_index_plan(min_chunks int default 10000)
+returns table (
+  skill_id uuid,
+  index_name text,
+  rebuild boolean,
+  create_statement text
+)
+language sql
+stable
+as $$
+  select big.skill_id,
+         big.index_name,
+         i.indexrelid is not null as rebuild,
+         format(
+           'CREATE INDEX CONCURRENTLY %I ON public.document_chunks USING hnsw (embedding vector_cosine_ops) '
+           'WITH (m = 16, ef_construction = 64) WHERE skill_id = %L',
+           big.index_name, big.skill_id
+         )
+  from (
+    select c.skill_id, 'idx_chunks_hnsw_' || replace(c.skill_id::text, '-', '') as index_name
+    from document_chunks c
+    where c.skill_id is not null
+    group by c.skill_id
+    having count(*) >= min_chunks
+  ) big
+  left join pg_index i on i.indexrelid = to_regclass('public.' || big.index_name)
+  where i.indexrelid is null or not i.indisvalid;
+$$;
+
+-- match_documents filtered on the chunk's own skill_id. The query is run as
+-- dynamic SQL with the skill id inlined, so the planner sees the literal and
+-- can pick that skill's partial index (a generic plan with a parameter can't).
+drop function if exists match_documents;
+
+create or replace function match_documents (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  content text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'select nearest.id, nearest.content, nearest.similarity
+     from (
+       select document_chunks.id, document_chunks.content,
+              1 - (document_chunks.embedding <=> $1) as similarity
+       from document_chunks
+       where document_chunks.skill_id = %L
+       order by document_chunks.embedding <=> $1
+       limit $2
+     ) nearest
+     where nearest.similarity > $3
+     order by nearest.similarity desc',
+    filter_skill_id
+  ) using query_embedding, match_count, match_threshold;
+end;
+$$;
@@ -0,0 +1,110 @@
+-- Phase 14: Full-text search on chunks and hybrid (lexical + vector) retrieval
+-- Short keyword queries ("quiz me on recursion") are matched better by the
+-- words themselves than by embedding distance.
+
+ALTER TABLE public.document_chunks
+  ADD COLUMN IF NOT EXISTS content_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_content_tsv
+  ON public.document_chunks USING gin (content_tsv);
+
+-- Top candidates from the GIN index and from the vector index, fused with
+-- reciprocal rank fusion (score = sum of 1 / (rrf_k + rank) over both lists).
+-- Vector-only candidates must still pass match_threshold; lexical hits always count.
+-- When the query has at least two terms and match_count chunks contain all of
+-- them, the lexical side is taken as confident and vector ranking is skipped.
+create or replace function match_documents_hybrid (
+  query_text text,
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40,
+  rrf_k int default 60
+)
+returns table (
+  id uuid,
+  content text,
+  similarity float,
+  score float
+)
+language plpgsql
+as $$
+declare
+  all_terms tsquery := plainto_tsquery('english', query_text);
+  any_terms tsquery;
+  candidates int := match_count * 4;
+  confident_hits int := 0;
+begin
+  -- Stopword-only queries ("what is this?") have no lexical side
+  if numnode(all_terms) = 0 then
+    return query
+    select m.id, m.content, m.similarity, m.similarity
+    from match_documents(query_embedding, match_threshold, match_count, filter_skill_id, ef_search) m;
+    return;
+  end if;
+  any_terms := replace(all_terms::text, ' & ', ' | ')::tsquery;
+
+  -- A single term matches most chunks on its topic, so only queries of two or
+  -- more terms (numnode counts the '&' nodes too) can take the lexical shortcut
+  if numnode(all_terms) >= 3 then
+    select count(*) into confident_hits
+    from (
+      select 1 from document_chunks c
+      where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+      limit match_count
+    ) hits;
+  end if;
+
+  if confident_hits >= match_count then
+    return query
+    select c.id, c.content,
+           1 - (c.embedding <=> query_embedding) as similarity,
+           ts_rank_cd(c.content_tsv, all_terms)::float as score
+    from document_chunks c
+    where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+    order by ts_rank_cd(c.content_tsv, all_terms) desc
+    limit match_count;
+    return;
+  end if;
+
+  perform set_config('hnsw.ef_search', greatest(ef_search, candidates)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  -- Skill id inlined so the vector side can use the skill's partial index (phase 13)
+  return query execute format(
+    'with lexical as (
+       select c.id, row_number() over (order by ts_rank_cd(c.content_tsv, $2) desc) as rank
+       from document_chunks c
+       where c.skill_id = %1$L and c.content_tsv @@ $2
+       order by ts_rank_cd(c.content_tsv, $2) desc
+       limit $3
+     ),
+     semantic as (
+       select nearest.id, row_number() over (order by nearest.distance) as rank
+       from (
+         select c.id, c.embedding <=> $1 as distance
+         from document_chunks c
+         where c.skill_id = %1$L
+         order by c.embedding <=> $1
+         limit $3
+       ) nearest
+     ),
+     fused as (
+       select coalesce(l.id, s.id) as id,
+              coalesce(1.0 / ($4 + l.rank), 0) + coalesce(1.0 / ($4 + s.rank), 0) as score,
+              l.id is not null as lexical_hit
+       from lexical l
+       full join semantic s on s.id = l.id
+     )
+     select c.id, c.content, 1 - (c.embedding <=> $1) as similarity, f.score::float
+     from fused f
+     join document_chunks c on c.id = f.id
+     where f.lexical_hit or 1 - (c.embedding <=> $1) > $5
+     order by f.score desc
+     limit $6',
+    filter_skill_id
+  ) using query_embedding, any_terms, candidates, rrf_k, match_threshold, match_count;
+end;
+$$;
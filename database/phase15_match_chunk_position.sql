@@ -0,0 +1,141 @@
+-- Phase 15: Retrieval RPCs also return each chunk's position
+-- (document_id, chunk_index) so the backend can stitch adjacent chunks back
+-- together instead of sending their 200-character overlaps to the LLM twice.
+-- Same bodies as phases 13 and 14; only the result columns change.
+
+drop function if exists match_documents_hybrid;
+drop function if exists match_documents;
+
+create or replace function match_documents (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'select nearest.id, nearest.document_id, nearest.chunk_index, nearest.content, nearest.similarity
+     from (
+       select document_chunks.id, document_chunks.document_id, document_chunks.chunk_index,
+              document_chunks.content,
+              1 - (document_chunks.embedding <=> $1) as similarity
+       from document_chunks
+       where document_chunks.skill_id = %L
+       order by document_chunks.embedding <=> $1
+       limit $2
+     ) nearest
+     where nearest.similarity > $3
+     order by nearest.similarity desc',
+    filter_skill_id
+  ) using query_embedding, match_count, match_threshold;
+end;
+$$;
+
+create or replace function match_documents_hybrid (
+  query_text text,
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40,
+  rrf_k int default 60
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float,
+  score float
+)
+language plpgsql
+as $$
+declare
+  all_terms tsquery := plainto_tsquery('english', query_text);
+  any_terms tsquery;
+  candidates int := match_count * 4;
+  confident_hits int := 0;
+begin
+  if numnode(all_terms) = 0 then
+    return query
+    select m.id, m.document_id, m.chunk_index, m.content, m.similarity, m.similarity
+    from match_documents(query_embedding, match_threshold, match_count, filter_skill_id, ef_search) m;
+    return;
+  end if;
+  any_terms := replace(all_terms::text, ' & ', ' | ')::tsquery;
+
+  -- A single term matches most chunks on its topic, so only queries of two or
+  -- more terms (numnode counts the '&' nodes too) can take the lexical shortcut
+  if numnode(all_terms) >= 3 then
+    select count(*) into confident_hits
+    from (
+      select 1 from document_chunks c
+      where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+      limit match_count
+    ) hits;
+  end if;
+
+  if confident_hits >= match_count then
+    return query
+    select c.id, c.document_id, c.chunk_index, c.content,
+           1 - (c.embedding <=> query_embedding) as similarity,
+           ts_rank_cd(c.content_tsv, all_terms)::float as score
+    from document_chunks c
+    where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+    order by ts_rank_cd(c.content_tsv, all_terms) desc
+    limit match_count;
+    return;
+  end if;
+
+  perform set_config('hnsw.ef_search', greatest(ef_search, candidates)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'with lexical as (
+       select c.id, row_number() over (order by ts_rank_cd(c.content_tsv, $2) desc) as rank
+       from document_chunks c
+       where c.skill_id = %1$L and c.content_tsv @@ $2
+       order by ts_rank_cd(c.content_tsv, $2) desc
+       limit $3
+     ),
+     semantic as (
+       select nearest.id, row_number() over (order by nearest.distance) as rank
+       from (
+         select c.id, c.embedding <=> $1 as distance
+         from document_chunks c
+         where c.skill_id = %1$L
+         order by c.embedding <=> $1
+         limit $3
+       ) nearest
+     ),
+     fused as (
+       select coalesce(l.id, s.id) as id,
+              coalesce(1.0 / ($4 + l.rank), 0) + coalesce(1.0 / ($4 + s.rank), 0) as score,
+              l.id is not null as lexical_hit
+       from lexical l
+       full join semantic s on s.id = l.id
+     )
+     select c.id, c.document_id, c.chunk_index, c.content,
+            1 - (c.embedding <=> $1) as similarity, f.score::float
+     from fused f
+     join document_chunks c on c.id = f.id
+     where f.lexical_hit or 1 - (c.embedding <=> $1) > $5
+     order by f.score desc
+     limit $6',
+    filter_skill_id
+  ) using query_embedding, any_terms, candidates, rrf_k, match_threshold, match_count;
+end;
+$$;
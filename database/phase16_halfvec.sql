@@ -0,0 +1,53 @@
+-- Phase 16: Half-precision embeddings, step 1 of 2 (requires pgvector >= 0.7)
+-- halfvec stores 2 bytes per dimension instead of 4, halving the table, the
+-- HNSW index and every transfer of vectors. MiniLM embeddings lose nothing
+-- measurable at fp16 (see backend/bench_halfvec_recall.py).
+--
+-- Rollout:
+--   1. Run this file. New and updated chunks fill embedding_half via trigger.
+--   2. Backfill existing rows: python backend/backfill_halfvec.py
+--      (calls backfill_halfvec_embeddings() until it returns 0).
+--   3. Run phase17_halfvec_cutover.sql to swap the columns.
+
+ALTER TABLE public.document_chunks ADD COLUMN IF NOT EXISTS embedding_half halfvec(384);
+
+create or replace function sync_embedding_half()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.embedding_half := new.embedding::halfvec(384);
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_chunk_embedding_half ON public.document_chunks;
+CREATE TRIGGER on_chunk_embedding_half
+  BEFORE INSERT OR UPDATE OF embedding ON public.document_chunks
+  FOR EACH ROW EXECUTE PROCEDURE sync_embedding_half();
+
+-- Converts one batch of rows; short transactions keep row locks brief
+create or replace function backfill_halfvec_embeddings(batch_size int default 5000)
+returns int
+language plpgsql
+as $$
+declare
+  converted int;
+begin
+  update document_chunks
+  set embedding_half = document_chunks.embedding::halfvec(384)
+  where document_chunks.id in (
+    select c.id from document_chunks c
+    where c.embedding_half is null and c.embedding is not null
+    limit batch_size
+    for update skip locked
+  );
+  get diagnostics converted = row_count;
+  return converted;
+end;
+$$;
+
+-- Built ahead of the cutover so the swap doesn't wait on it
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_half_hnsw
+  ON public.document_chunks USING hnsw (embedding_half halfvec_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
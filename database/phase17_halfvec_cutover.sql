@@ -0,0 +1,188 @@
+-- Phase 17: Half-precision embeddings, step 2 of 2
+-- Run once backfill_halfvec_embeddings() returns 0 (phase16_halfvec.sql).
+-- Afterwards document_chunks.embedding is halfvec(384). The RPCs still take
+-- vector(384) arguments and cast them, so callers don't change.
+
+BEGIN;
+
+-- Rows written since the backfill finished are covered by the trigger; this catches stragglers
+UPDATE public.document_chunks
+SET embedding_half = embedding::halfvec(384)
+WHERE embedding_half IS NULL AND embedding IS NOT NULL;
+
+DROP TRIGGER IF EXISTS on_chunk_embedding_half ON public.document_chunks;
+drop function if exists sync_embedding_half();
+drop function if exists backfill_halfvec_embeddings(int);
+
+-- Drops the fp32 HNSW index and any per-skill partial indexes with it
+ALTER TABLE public.document_chunks DROP COLUMN embedding;
+ALTER TABLE public.document_chunks RENAME COLUMN embedding_half TO embedding;
+ALTER INDEX IF EXISTS idx_document_chunks_embedding_half_hnsw RENAME TO idx_document_chunks_embedding_hnsw;
+
+COMMIT;
+
+-- Per-skill partial indexes are built on the halfvec column from now on
+create or replace function skill_vector_index_plan(min_chunks int default 10000)
+returns table (
+  skill_id uuid,
+  index_name text,
+  rebuild boolean,
+  create_statement text
+)
+language sql
+stable
+as $$
+  select big.skill_id,
+         big.index_name,
+         i.indexrelid is not null as rebuild,
+         format(
+           'CREATE INDEX CONCURRENTLY %I ON public.document_chunks USING hnsw (embedding halfvec_cosine_ops) '
+           'WITH (m = 16, ef_construction = 64) WHERE skill_id = %L',
+           big.index_name, big.skill_id
+         )
+  from (
+    select c.skill_id, 'idx_chunks_hnsw_' || replace(c.skill_id::text, '-', '') as index_name
+    from document_chunks c
+    where c.skill_id is not null
+    group by c.skill_id
+    having count(*) >= min_chunks
+  ) big
+  left join pg_index i on i.indexrelid = to_regclass('public.' || big.index_name)
+  where i.indexrelid is null or not i.indisvalid;
+$$;
+
+-- Same as phase 15, with the query vector cast to halfvec so the index applies
+create or replace function match_documents (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'select nearest.id, nearest.document_id, nearest.chunk_index, nearest.content, nearest.similarity
+     from (
+       select document_chunks.id, document_chunks.document_id, document_chunks.chunk_index,
+              document_chunks.content,
+              1 - (document_chunks.embedding <=> $1) as similarity
+       from document_chunks
+       where document_chunks.skill_id = %L
+       order by document_chunks.embedding <=> $1
+       limit $2
+     ) nearest
+     where nearest.similarity > $3
+     order by nearest.similarity desc',
+    filter_skill_id
+  ) using query_embedding::halfvec(384), match_count, match_threshold;
+end;
+$$;
+
+create or replace function match_documents_hybrid (
+  query_text text,
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40,
+  rrf_k int default 60
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float,
+  score float
+)
+language plpgsql
+as $$
+declare
+  all_terms tsquery := plainto_tsquery('english', query_text);
+  any_terms tsquery;
+  query_half halfvec(384) := query_embedding::halfvec(384);
+  candidates int := match_count * 4;
+  confident_hits int := 0;
+begin
+  if numnode(all_terms) = 0 then
+    return query
+    select m.id, m.document_id, m.chunk_index, m.content, m.similarity, m.similarity
+    from match_documents(query_embedding, match_threshold, match_count, filter_skill_id, ef_search) m;
+    return;
+  end if;
+  any_terms := replace(all_terms::text, ' & ', ' | ')::tsquery;
+
+  -- A single term matches most chunks on its topic, so only queries of two or
+  -- more terms (numnode counts the '&' nodes too) can take the lexical shortcut
+  if numnode(all_terms) >= 3 then
+    select count(*) into confident_hits
+    from (
+      select 1 from document_chunks c
+      where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+      limit match_count
+    ) hits;
+  end if;
+
+  if confident_hits >= match_count then
+    return query
+    select c.id, c.document_id, c.chunk_index, c.content,
+           1 - (c.embedding <=> query_half) as similarity,
+           ts_rank_cd(c.content_tsv, all_terms)::float as score
+    from document_chunks c
+    where c.skill_id = filter_skill_id and c.content_tsv @@ all_terms
+    order by ts_rank_cd(c.content_tsv, all_terms) desc
+    limit match_count;
+    return;
+  end if;
+
+  perform set_config('hnsw.ef_search', greatest(ef_search, candidates)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'with lexical as (
+       select c.id, row_number() over (order by ts_rank_cd(c.content_tsv, $2) desc) as rank
+       from document_chunks c
+       where c.skill_id = %1$L and c.content_tsv @@ $2
+       order by ts_rank_cd(c.content_tsv, $2) desc
+       limit $3
+     ),
+     semantic as (
+       select nearest.id, row_number() over (order by nearest.distance) as rank
+       from (
+         select c.id, c.embedding <=> $1 as distance
+         from document_chunks c
+         where c.skill_id = %1$L
+         order by c.embedding <=> $1
+         limit $3
+       ) nearest
+     ),
+     fused as (
+       select coalesce(l.id, s.id) as id,
+              coalesce(1.0 / ($4 + l.rank), 0) + coalesce(1.0 / ($4 + s.rank), 0) as score,
+              l.id is not null as lexical_hit
+       from lexical l
+       full join semantic s on s.id = l.id
+     )
+     select c.id, c.document_id, c.chunk_index, c.content,
+            1 - (c.embedding <=> $1) as similarity, f.score::float
+     from fused f
+     join document_chunks c on c.id = f.id
+     where f.lexical_hit or 1 - (c.embedding <=> $1) > $5
+     order by f.score desc
+     limit $6',
+    filter_skill_id
+  ) using query_half, any_terms, candidates, rrf_k, match_threshold, match_count;
+end;
+$$;
@@ -0,0 +1,51 @@
+-- Phase 18: Several retrievals in one round trip
+-- Multi-topic quizzes (and similar flows) send all their query vectors at
+-- once. Each query gets its own top match_count from the skill; a chunk that
+-- several queries retrieve is returned once, under the query it matches best.
+-- Vectors are passed as pgvector text ("[0.1,...]") since PostgREST maps a
+-- JSON array of strings to text[]. Assumes the halfvec column (phase 17).
+
+create or replace function match_documents_multi (
+  query_embeddings text[],
+  match_threshold float,
+  match_count int,
+  filter_skill_id uuid,
+  ef_search int default 40
+)
+returns table (
+  query_index int,
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  perform prepare_skill_vector_scan(filter_skill_id);
+
+  return query execute format(
+    'select best.query_index, best.id, best.document_id, best.chunk_index, best.content, best.similarity
+     from (
+       select distinct on (hits.id)
+              hits.query_index, hits.id, hits.document_id, hits.chunk_index, hits.content, hits.similarity
+       from unnest($1) with ordinality as q(embedding, position)
+       cross join lateral (
+         select (q.position - 1)::int as query_index,
+                c.id, c.document_id, c.chunk_index, c.content,
+                1 - (c.embedding <=> q.embedding::halfvec(384)) as similarity
+         from document_chunks c
+         where c.skill_id = %L
+         order by c.embedding <=> q.embedding::halfvec(384)
+         limit $2
+       ) hits
+       where hits.similarity > $3
+       order by hits.id, hits.similarity desc
+     ) best
+     order by best.query_index, best.similarity desc',
+    filter_skill_id
+  ) using query_embeddings, match_count, match_threshold;
+end;
+$$;
@@ -0,0 +1,50 @@
+-- Phase 19: Lexical side of hybrid search on its own
+-- When a skill's vectors are already in the backend's in-memory index
+-- (services/vector_index.py) only the full-text candidates need a round
+-- trip; the backend fuses them with its own vector ranking the same way
+-- match_documents_hybrid does (reciprocal rank fusion).
+-- Returns up to candidate_count chunks matching any query term, best
+-- ts_rank_cd first, whether each contains every term (all_terms), and how
+-- many terms the query has (term_count; the shortcut needs at least two).
+
+-- Return type changed (term_count), so replace rather than redefine
+drop function if exists match_documents_lexical(text, int, uuid);
+
+create or replace function match_documents_lexical (
+  query_text text,
+  candidate_count int,
+  filter_skill_id uuid
+)
+returns table (
+  id uuid,
+  rank_score float,
+  all_terms boolean,
+  term_count int
+)
+language plpgsql
+as $$
+declare
+  every_term tsquery := plainto_tsquery('english', query_text);
+  any_term tsquery;
+  terms int;
+begin
+  -- Stopword-only queries have no lexical side
+  if numnode(every_term) = 0 then
+    return;
+  end if;
+  any_term := replace(every_term::text, ' & ', ' | ')::tsquery;
+  -- n terms joined by n - 1 '&' nodes
+  terms := (numnode(every_term) + 1) / 2;
+
+  -- Chunks with every term first, so the confident case is never cut off by the limit
+  return query
+  select c.id,
+         ts_rank_cd(c.content_tsv, any_term)::float as rank_score,
+         c.content_tsv @@ every_term as all_terms,
+         terms as term_count
+  from document_chunks c
+  where c.skill_id = filter_skill_id and c.content_tsv @@ any_term
+  order by c.content_tsv @@ every_term desc, ts_rank_cd(c.content_tsv, any_term) desc
+  limit candidate_count;
+end;
+$$;
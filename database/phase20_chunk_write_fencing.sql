@@ -0,0 +1,132 @@
+-- Phase 20: Fence chunk writes by lease generation
+-- Replacing a document takes the lease away from the job processing the old
+-- version, but that worker only notices at its next heartbeat. Until then it
+-- could keep inserting old chunks, or delete rows the new job counted as kept.
+-- Every claim now bumps documents.generation, and chunk inserts, deletes and
+-- renumbers only go through while the caller holds the lease of that
+-- generation (locked_by = worker and generation = gen). The document row is
+-- share-locked for the write, so a replace can't commit in between.
+
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS generation bigint DEFAULT 0 NOT NULL;
+
+-- claim_documents is the only writer that increments attempts (replace resets it)
+create or replace function bump_document_generation()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.attempts > old.attempts then
+    new.generation := old.generation + 1;
+  end if;
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_document_claimed ON public.documents;
+CREATE TRIGGER on_document_claimed
+  BEFORE UPDATE OF attempts ON public.documents
+  FOR EACH ROW EXECUTE PROCEDURE bump_document_generation();
+
+-- Raises SQLSTATE LL001 unless worker_id holds the lease of lease_generation.
+-- Holds a share lock on the document row until the caller's transaction ends.
+create or replace function hold_document_lease (
+  doc_id uuid,
+  worker_id text,
+  lease_generation bigint
+)
+returns void
+language plpgsql
+as $$
+begin
+  perform 1
+  from documents d
+  where d.id = doc_id
+    and d.locked_by = worker_id
+    and d.generation = lease_generation
+    and d.status = 'processing'
+  for share;
+  if not found then
+    raise exception 'Lease lost on document % (generation %)', doc_id, lease_generation
+      using errcode = 'LL001';
+  end if;
+end;
+$$;
+
+-- PostgREST path of the worker's ChunkWriter (the COPY path calls hold_document_lease itself)
+create or replace function insert_document_chunks (
+  doc_id uuid,
+  worker_id text,
+  lease_generation bigint,
+  chunks jsonb
+)
+returns int
+language plpgsql
+as $$
+declare
+  inserted int;
+begin
+  perform hold_document_lease(doc_id, worker_id, lease_generation);
+  insert into document_chunks (document_id, skill_id, content, embedding, chunk_index, page_number)
+  select doc_id, r.skill_id, r.content, r.embedding, r.chunk_index, r.page_number
+  from jsonb_populate_recordset(null::document_chunks, chunks) r;
+  get diagnostics inserted = row_count;
+  return inserted;
+end;
+$$;
+
+-- Deletes and renumbers in one transaction (replaces renumber_document_chunks for the worker)
+create or replace function apply_chunk_diff (
+  doc_id uuid,
+  worker_id text,
+  lease_generation bigint,
+  stale_ids uuid[],
+  chunk_ids uuid[],
+  chunk_indexes int[],
+  page_numbers int[]
+)
+returns int
+language plpgsql
+as $$
+declare
+  removed int;
+begin
+  perform hold_document_lease(doc_id, worker_id, lease_generation);
+
+  delete from document_chunks
+  where document_chunks.id = any(stale_ids)
+    and document_chunks.document_id = doc_id;
+  get diagnostics removed = row_count;
+
+  update document_chunks
+  set chunk_index = moved.chunk_index,
+      page_number = moved.page_number
+  from unnest(chunk_ids, chunk_indexes, page_numbers) as moved(id, chunk_index, page_number)
+  where document_chunks.id = moved.id
+    and document_chunks.document_id = doc_id;
+
+  return removed;
+end;
+$$;
+
+-- Heartbeats also stop once the document was claimed again, even by the same worker
+drop function if exists heartbeat_document(uuid, text, int);
+
+create or replace function heartbeat_document (
+  doc_id uuid,
+  worker_id text,
+  lease_seconds int default 300,
+  lease_generation bigint default null
+)
+returns boolean
+language plpgsql
+as $$
+begin
+  update documents
+  set lease_expires_at = now() + make_interval(secs => lease_seconds)
+  where documents.id = doc_id
+    and documents.locked_by = worker_id
+    and documents.status = 'processing'
+    and (lease_generation is null or documents.generation = lease_generation);
+  return found;
+end;
+$$;
@@ -0,0 +1,28 @@
+-- Phase 21: Per-skill version for the backend's in-memory vector index
+-- Without a LISTEN connection (DATABASE_URL unset) the backend can't hear the
+-- 'document_ready' NOTIFY, so it compares this counter with the one it loaded
+-- the skill at instead (services/vector_index.py). It is bumped on the same
+-- events as the NOTIFY: a document of the skill becoming ready or being deleted.
+
+ALTER TABLE public.skills ADD COLUMN IF NOT EXISTS chunks_version bigint DEFAULT 0 NOT NULL;
+
+create or replace function notify_document_ready()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op = 'DELETE' then
+    if old.skill_id is not null then
+      update skills set chunks_version = chunks_version + 1 where id = old.skill_id;
+      perform pg_notify('document_ready', old.skill_id::text);
+    end if;
+    return old;
+  end if;
+
+  if new.status = 'ready' and new.skill_id is not null then
+    update skills set chunks_version = chunks_version + 1 where id = new.skill_id;
+    perform pg_notify('document_ready', new.skill_id::text);
+  end if;
+  return new;
+end;
+$$;
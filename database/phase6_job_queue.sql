@@ -0,0 +1,73 @@
+-- Phase 6: Ingestion job queue
+-- Lets several worker replicas pull from documents without processing the same row twice.
+
+-- Lease bookkeeping on documents
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS locked_by text;
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS lease_expires_at timestamp with time zone;
+ALTER TABLE public.documents ADD COLUMN IF NOT EXISTS attempts integer DEFAULT 0 NOT NULL;
+
+-- Claimable rows: pending ones, plus processing ones whose worker stopped heartbeating
+CREATE INDEX IF NOT EXISTS idx_documents_claimable
+  ON public.documents (created_at)
+  WHERE status IN ('pending', 'processing');
+
+-- Atomically claim up to batch_size documents for one worker.
+-- FOR UPDATE SKIP LOCKED makes concurrent callers pick disjoint rows.
+create or replace function claim_documents (
+  worker_id text,
+  batch_size int default 1,
+  lease_seconds int default 300,
+  max_attempts int default 3
+)
+returns setof documents
+language plpgsql
+as $$
+begin
+  -- Jobs whose lease expired too many times are given up on
+  update documents
+  set status = 'failed',
+      error_message = 'Gave up after ' || documents.attempts || ' attempts (worker lease expired)',
+      locked_by = null,
+      lease_expires_at = null
+  where documents.status = 'processing'
+    and documents.lease_expires_at < now()
+    and documents.attempts >= max_attempts;
+
+  return query
+  update documents
+  set status = 'processing',
+      locked_by = worker_id,
+      lease_expires_at = now() + make_interval(secs => lease_seconds),
+      attempts = documents.attempts + 1
+  where documents.id in (
+    select d.id
+    from documents d
+    where d.status = 'pending'
+       or (d.status = 'processing' and d.lease_expires_at < now())
+    order by d.created_at
+    limit batch_size
+    for update skip locked
+  )
+  returning documents.*;
+end;
+$$;
+
+-- Extend the lease on a document the worker is still processing.
+-- Returns false when the lease was lost (expired and reclaimed by another worker).
+create or replace function heartbeat_document (
+  doc_id uuid,
+  worker_id text,
+  lease_seconds int default 300
+)
+returns boolean
+language plpgsql
+as $$
+begin
+  update documents
+  set lease_expires_at = now() + make_interval(secs => lease_seconds)
+  where documents.id = doc_id
+    and documents.locked_by = worker_id
+    and documents.status = 'processing';
+  return found;
+end;
+$$;
@@ -0,0 +1,19 @@
+-- Phase 7: Push notifications for the ingestion worker
+-- Idle workers LISTEN on 'document_pending' instead of polling the documents table.
+
+create or replace function notify_document_pending()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.status = 'pending' then
+    perform pg_notify('document_pending', new.id::text);
+  end if;
+  return new;
+end;
+$$;
+
+DROP TRIGGER IF EXISTS on_document_pending ON public.documents;
+CREATE TRIGGER on_document_pending
+  AFTER INSERT OR UPDATE OF status ON public.documents
+  FOR EACH ROW EXECUTE PROCEDURE notify_document_pending();
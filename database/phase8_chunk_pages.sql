@@ -0,0 +1,3 @@
+-- Phase 8: Page numbers on document chunks
+-- Set by the worker from the PDF page a chunk starts on (NULL for plain-text uploads).
+ALTER TABLE public.document_chunks ADD COLUMN IF NOT EXISTS page_number integer;
@@ -0,0 +1,23 @@
+-- Phase 9: Incremental re-ingestion
+-- When a document is replaced, the worker keeps chunks whose content didn't change
+-- and only moves them to their new position in one round trip.
+
+create or replace function renumber_document_chunks (
+  doc_id uuid,
+  chunk_ids uuid[],
+  chunk_indexes int[],
+  page_numbers int[]
+)
+returns void
+language sql
+as $$
+  update document_chunks
+  set chunk_index = moved.chunk_index,
+      page_number = moved.page_number
+  from unnest(chunk_ids, chunk_indexes, page_numbers) as moved(id, chunk_index, page_number)
+  where document_chunks.id = moved.id
+    and document_chunks.document_id = doc_id;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_document
+  ON public.document_chunks (document_id, chunk_index);
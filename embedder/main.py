@@ -0,0 +1,114 @@
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from typing import List
+import asyncio
+import os
+import time
+
+from studysensei_shared.embedding_backend import load_embedding_model
+
+app = FastAPI(title="StudySensei Embedder")
+
+# Concurrent requests arriving within MAX_WAIT_MS of each other are encoded
+# together in one model call of at most MAX_BATCH texts.
+MAX_BATCH = int(os.environ.get("EMBEDDER_MAX_BATCH", "64"))
+MAX_WAIT = float(os.environ.get("EMBEDDER_MAX_WAIT_MS", "5")) / 1000
+# Clients (backend/services/embedding_client.py) split larger inputs into requests of this size
+MAX_TEXTS_PER_REQUEST = int(os.environ.get("EMBEDDER_MAX_TEXTS_PER_REQUEST", "256"))
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+class DynamicBatcher:
+    def __init__(self, model, max_batch: int, max_wait: float):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+
+    async def embed(self, texts):
+        # A request bigger than one model batch is queued as several, so it can't
+        # become a single oversized encode call
+        loop = asyncio.get_running_loop()
+        futures = []
+        for i in range(0, len(texts), self.max_batch):
+            future = loop.create_future()
+            await self.queue.put((texts[i:i + self.max_batch], future))
+            futures.append(future)
+        parts = await asyncio.gather(*futures)
+        return [vector for part in parts for vector in part]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            items = [carry] if carry else [await self.queue.get()]
+            carry = None
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(item[0]) > self.max_batch:
+                    carry = item
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            texts = [text for part, _ in items for text in part]
+            start = time.perf_counter()
+            try:
+                # The model call blocks, so it runs off the event loop
+                vectors = await loop.run_in_executor(None, self.model.encode, texts)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.encode_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.texts += len(texts)
+
+            offset = 0
+            for part, future in items:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(part)])
+                offset += len(part)
+
+batcher = None
+model_id = None
+
+@app.on_event("startup")
+async def load_model():
+    global batcher, model_id
+    model, model_id = load_embedding_model()
+    batcher = DynamicBatcher(model, MAX_BATCH, MAX_WAIT)
+    asyncio.create_task(batcher.run())
+    print(f"Embedder ready ({model_id}, max batch {MAX_BATCH}, max wait {MAX_WAIT * 1000:.0f}ms)")
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    if not request.texts:
+        return {"model": model_id, "embeddings": []}
+    if len(request.texts) > MAX_TEXTS_PER_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_TEXTS_PER_REQUEST} texts per request; split the batch")
+    vectors = await batcher.embed(request.texts)
+    return {"model": model_id, "embeddings": [v.tolist() for v in vectors]}
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok" if batcher else "loading",
+        "model": model_id,
+        "batches": batcher.batches if batcher else 0,
+        "texts": batcher.texts if batcher else 0,
+        "mean_batch_size": round(batcher.texts / batcher.batches, 2) if batcher and batcher.batches else 0
+    }
@@ -0,0 +1,6 @@
+"""
+Code shared by the backend, the ingestion worker and the embedder.
+
+Installed into each service from its requirements.txt (`-e ../shared`), so
+there is one copy of every module instead of one per service.
+"""
@@ -0,0 +1,161 @@
+"""
+Paged bulk writer for document_chunks.
+
+Rows are sent in pages bounded by row count and approximate payload
+size, with embeddings encoded as compact pgvector text ("[0.1,0.2,...]")
+instead of JSON float lists, rounded to the fp16 precision of the halfvec
+column (phase 16/17). When CHUNK_COPY_DSN names a direct connection to
+the Postgres that holds document_chunks, pages are streamed with COPY
+instead of going through PostgREST. A failed page is retried on its own.
+
+Writes made on behalf of a claimed document pass its lease (document id,
+worker id, generation); the database rejects every page once that lease is
+gone (phase20_chunk_write_fencing.sql) and write() raises LeaseLost.
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+COLUMNS = ("document_id", "skill_id", "content", "embedding", "chunk_index", "page_number")
+# Raised by hold_document_lease() in phase20_chunk_write_fencing.sql
+LEASE_LOST_SQLSTATE = "LL001"
+
+
+class LeaseLost(Exception):
+    """Raised when another worker (or a newer claim) has taken over a document we were processing."""
+
+
+def is_lease_lost(error: Exception) -> bool:
+    """True for the fencing error, whether it came through PostgREST or psycopg2."""
+    return LEASE_LOST_SQLSTATE in (getattr(error, "code", None), getattr(error, "pgcode", None))
+
+
+def format_vector(embedding) -> str:
+    """
+    pgvector text form of the fp16-rounded vector. 5 significant digits round-trip
+    any fp16 value exactly, so the halfvec column stores the same numbers while
+    each vector is ~10% shorter on the wire than with 6 digits of fp32.
+    """
+    values = np.asarray(embedding, dtype=np.float32).astype(np.float16).astype(np.float32)
+    return "[" + ",".join(np.char.mod("%.5g", values)) + "]"
+
+
+class ChunkWriter:
+    def __init__(self, supabase, dsn: str = None, max_rows: int = 200,
+                 max_bytes: int = 1_000_000, retries: int = 3, backoff: float = 0.5):
+        self.supabase = supabase
+        self.dsn = dsn if dsn is not None else os.environ.get("CHUNK_COPY_DSN")
+        if self.dsn:
+            try:
+                import psycopg2  # noqa: F401
+            except ImportError:
+                print("psycopg2 not installed; writing chunks through PostgREST instead of COPY.")
+                self.dsn = None
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.rows_written = 0
+        self.seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows_written / self.seconds if self.seconds else 0.0
+
+    def write(self, records, lease=None) -> int:
+        """
+        Inserts chunk records (dicts keyed by COLUMNS). Returns the number of rows written.
+        With lease=(document id, worker id, generation) every page is fenced on that lease.
+        """
+        rows = [self._encode(r) for r in records]
+        written = 0
+        for page in self._pages(rows):
+            written += self._write_page(page, lease)
+        return written
+
+    def _encode(self, record) -> dict:
+        row = {column: record.get(column) for column in COLUMNS}
+        embedding = row["embedding"]
+        if embedding is not None and not isinstance(embedding, str):
+            row["embedding"] = format_vector(embedding)
+        return row
+
+    def _pages(self, rows):
+        page, size = [], 0
+        for row in rows:
+            # Rough wire size: content and vector dominate
+            row_size = len(row["content"] or "") + len(row["embedding"] or "") + 128
+            if page and (len(page) >= self.max_rows or size + row_size > self.max_bytes):
+                yield page
+                page, size = [], 0
+            page.append(row)
+            size += row_size
+        if page:
+            yield page
+
+    def _write_page(self, page, lease=None) -> int:
+        for attempt in range(1, self.retries + 1):
+            start = time.perf_counter()
+            try:
+                if self.dsn:
+                    self._copy_page(page, lease)
+                elif lease:
+                    doc_id, worker_id, generation = lease
+                    self.supabase.rpc("insert_document_chunks", {
+                        "doc_id": doc_id,
+                        "worker_id": worker_id,
+                        "lease_generation": generation,
+                        "chunks": page
+                    }).execute()
+                else:
+                    self.supabase.table("document_chunks").insert(page).execute()
+            except Exception as e:
+                if is_lease_lost(e):
+                    raise LeaseLost(str(e)) from e
+                if attempt == self.retries:
+                    raise
+                print(f"Chunk page of {len(page)} rows failed (attempt {attempt}): {e}")
+                time.sleep(self.backoff * attempt)
+                continue
+            with self._stats_lock:
+                self.rows_written += len(page)
+                self.seconds += time.perf_counter() - start
+            return len(page)
+        return 0
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+
+                self._pool = ThreadedConnectionPool(1, 8, self.dsn)
+            return self._pool
+
+    def _copy_page(self, page, lease=None):
+        buffer = io.StringIO()
+        out = csv.writer(buffer)
+        for row in page:
+            out.writerow(["" if row[c] is None else row[c] for c in COLUMNS])
+        buffer.seek(0)
+
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if lease:
+                    # Share-locks the document row for the rest of this transaction
+                    cur.execute("select hold_document_lease(%s, %s, %s)", lease)
+                cur.copy_expert(
+                    f"COPY public.document_chunks ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+        finally:
+            pool.putconn(conn)
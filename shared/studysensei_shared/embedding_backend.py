@@ -0,0 +1,74 @@
+"""
+Selectable inference backend for the embedding model.
+
+EMBEDDING_BACKEND picks how all-MiniLM-L6-v2 runs:
+
+- torch (default): fp32 PyTorch, the reference implementation
+- onnx: fp32 ONNX Runtime
+- onnx-int8: ONNX Runtime with a dynamically int8-quantized graph, the
+  fastest option on CPU-only boxes. The quantized file matching the CPU
+  (arm64 / AVX512-VNNI / AVX512 / AVX2) is picked unless EMBEDDING_ONNX_FILE
+  names one explicitly.
+
+Any failure to load an ONNX variant falls back to torch. The returned
+model id includes the backend so cached vectors are never mixed across them.
+"""
+
+import os
+import platform
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+
+def _cpu_flags() -> set:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def quantized_onnx_file() -> str:
+    """The pre-quantized graph shipped with the model that best fits this CPU."""
+    explicit = os.environ.get("EMBEDDING_ONNX_FILE")
+    if explicit:
+        return explicit
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def model_id_for(backend: str = None) -> str:
+    """The model id load_embedding_model reports when the backend loads successfully."""
+    backend = backend or EMBEDDING_BACKEND
+    if backend in ("onnx", "onnx-int8"):
+        return f"{EMBEDDING_MODEL_NAME}@{backend}"
+    return EMBEDDING_MODEL_NAME
+
+
+def load_embedding_model(backend: str = None):
+    """Returns (model, model_id); model_id is the model name tagged with the backend actually used."""
+    # Imported here so processes that only use the embedder sidecar never load torch
+    from sentence_transformers import SentenceTransformer
+
+    backend = backend or EMBEDDING_BACKEND
+    if backend in ("onnx", "onnx-int8"):
+        try:
+            model_kwargs = {"file_name": quantized_onnx_file()} if backend == "onnx-int8" else None
+            model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+            return model, model_id_for(backend)
+        except Exception as e:
+            print(f"Could not load {backend} embedding backend, falling back to torch: {e}")
+    elif backend != "torch":
+        print(f"Unknown EMBEDDING_BACKEND '{backend}', using torch.")
+
+    return SentenceTransformer(EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME
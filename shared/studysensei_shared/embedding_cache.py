@@ -0,0 +1,203 @@
+"""
+Persistent, content-addressed embedding cache.
+
+Vectors are keyed by sha256(model name + chunk text) and stored as raw
+float32 in a local SQLite file, so re-uploads of the same lecture notes
+skip the model entirely. When the store grows past its byte budget the
+least recently used entries are evicted.
+
+Writes (new vectors and last-used times of hits) are buffered and
+committed together once EMBEDDING_CACHE_FLUSH_ROWS have piled up or
+EMBEDDING_CACHE_FLUSH_SECONDS have passed, so a backend encoding one
+query at a time doesn't commit to SQLite under the lock on every call.
+"""
+
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "studysensei", "embeddings.sqlite3")
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_PATH)
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.flush_rows = int(os.environ.get("EMBEDDING_CACHE_FLUSH_ROWS", "64"))
+        self.flush_seconds = float(os.environ.get("EMBEDDING_CACHE_FLUSH_SECONDS", "5"))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Not yet written: new vectors (key -> blob) and hits to mark used (key -> time)
+        self._pending = {}
+        self._touched = {}
+        self._last_flush = time.monotonic()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "bytes": self._size,
+        }
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys present in the cache."""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._pending:
+                    found[key] = np.frombuffer(self._pending[key], dtype=np.float32)
+            stored = [key for key in keys if key not in found]
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(stored), 500):
+                part = stored[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            now = time.time()
+            for key in found:
+                self._touched[key] = now
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+            self._maybe_flush()
+        return found
+
+    def put_many(self, items):
+        """Stores (key, vector) pairs, evicting least recently used entries over budget."""
+        blobs = {key: np.asarray(vector, dtype=np.float32).tobytes() for key, vector in items}
+        if not blobs:
+            return
+        with self._lock:
+            for key, blob in blobs.items():
+                self._pending.setdefault(key, blob)
+            self._maybe_flush()
+
+    def flush(self):
+        """Writes buffered vectors and last-used times (also runs at interpreter exit)."""
+        with self._lock:
+            self._flush()
+
+    def _maybe_flush(self):
+        buffered = len(self._pending) + len(self._touched)
+        if buffered >= self.flush_rows or (buffered and time.monotonic() - self._last_flush >= self.flush_seconds):
+            self._flush()
+
+    def _flush(self):
+        now = time.time()
+        added = 0
+        for key, blob in self._pending.items():
+            # A key already stored (a racing miss, or another process) is left alone and not counted again
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", (key, blob, now)
+            )
+            if cursor.rowcount == 1:
+                added += len(blob)
+        if self._touched:
+            self._db.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+        self._db.commit()
+        self._pending.clear()
+        self._touched.clear()
+        self._last_flush = time.monotonic()
+
+        self._size += added
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Trim to 90% so we don't evict on every insert near the limit
+        target = int(self.max_bytes * 0.9)
+        while self._size > target:
+            rows = self._db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                self._size -= size
+                if self._size <= target:
+                    break
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+            self._db.commit()
+
+
+class CachedEncoder:
+    """
+    Wraps anything with an encode(texts) method and serves repeated texts from the cache.
+    Accepts a single string (returns one vector) or a list (returns a 2-D array).
+    """
+
+    def __init__(self, encoder, cache: EmbeddingCache, model_name: str = None):
+        self.encoder = encoder
+        self.cache = cache
+        self.model_name = model_name
+
+    @property
+    def model_id(self):
+        """
+        Cache namespace. Encoders that know what actually produced their vectors
+        (RemoteEncoder reports the sidecar's model) take precedence over model_name.
+        """
+        return getattr(self.encoder, "model_id", None) or self.model_name
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        model_id = self.model_id
+        if self.cache is None or model_id is None:
+            return np.asarray(self.encoder.encode(texts), dtype=np.float32)
+
+        keys = [EmbeddingCache.key(model_id, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.encoder.encode(list(missing.values()))
+            if self.model_id != model_id:
+                # The encoder now runs another model: cached hits would mix vector spaces
+                return np.asarray(self.encoder.encode(texts), dtype=np.float32)
+            fresh = dict(zip(missing.keys(), (np.asarray(v, dtype=np.float32) for v in vectors)))
+            self.cache.put_many(fresh.items())
+            cached.update(fresh)
+
+        return np.stack([cached[key] for key in keys])
@@ -0,0 +1,100 @@
+"""
+Cross-document micro-batching for the embedding model.
+
+Documents processed concurrently submit their chunks here; a single
+background thread packs them into encode calls of up to `batch_size`
+texts, waiting at most `max_wait` seconds for a batch to fill. Vectors
+are routed back to each submitter through a Future.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    def __init__(self, model, batch_size: int = 128, max_wait: float = 0.05):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.encode_calls = 0
+        self.encoded_texts = 0
+        self.encode_seconds = 0.0
+        self._requests = queue.Queue()
+        self._carry = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts) -> Future:
+        """Queues texts for encoding; the Future resolves to their vectors, in order."""
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        # Split oversized requests so one huge document can't monopolize a call
+        parts = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        state = {"pending": len(parts), "results": [None] * len(parts), "lock": threading.Lock()}
+        for position, part in enumerate(parts):
+            self._requests.put((part, future, state, position))
+        return future
+
+    @property
+    def texts_per_sec(self) -> float:
+        return self.encoded_texts / self.encode_seconds if self.encode_seconds else 0.0
+
+    def encode(self, texts):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(texts).result()
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the batch is full or max_wait passes."""
+        items = [self._carry] if self._carry else [self._requests.get()]
+        self._carry = None
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.batch_size:
+                # Keep it for the next call rather than overflowing this one
+                self._carry = item
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            texts = [text for part, _, _, _ in items for text in part]
+            start = time.perf_counter()
+            try:
+                vectors = self.model.encode(texts)
+            except Exception as e:
+                for _, future, _, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.encode_calls += 1
+            self.encoded_texts += len(texts)
+            self.encode_seconds += time.perf_counter() - start
+
+            offset = 0
+            for part, future, state, position in items:
+                part_vectors = vectors[offset:offset + len(part)]
+                offset += len(part)
+                if future.done():
+                    continue
+                with state["lock"]:
+                    state["results"][position] = part_vectors
+                    state["pending"] -= 1
+                    finished = state["pending"] == 0
+                if finished:
+                    future.set_result([v for chunk in state["results"] for v in chunk])
@@ -0,0 +1,80 @@
+"""
+Benchmark: per-document encode calls vs. cross-document micro-batching.
+
+Simulates a mix of many small uploads and a few large ones and reports
+chunks/sec for both strategies. Run from the worker folder:
+
+    python bench_embedding.py --small-docs 200 --large-docs 2
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batcher import EmbeddingBatcher
+from studysensei_shared.embedding_backend import load_embedding_model
+
+WORDS = "gradient descent recursion tree graph matrix vector cell enzyme market supply demand theorem proof".split()
+
+
+def make_docs(small_docs: int, large_docs: int, seed: int = 0):
+    rng = random.Random(seed)
+
+    def chunk():
+        return " ".join(rng.choice(WORDS) for _ in range(150))
+
+    docs = [[chunk() for _ in range(rng.randint(1, 3))] for _ in range(small_docs)]
+    docs += [[chunk() for _ in range(400)] for _ in range(large_docs)]
+    rng.shuffle(docs)
+    return docs
+
+
+def bench_per_document(model, docs, batch_size):
+    start = time.perf_counter()
+    for chunks in docs:
+        for i in range(0, len(chunks), batch_size):
+            model.encode(chunks[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def bench_batched(model, docs, batch_size, encode_batch_size, max_wait, concurrency):
+    batcher = EmbeddingBatcher(model, encode_batch_size, max_wait)
+
+    def process(chunks):
+        for i in range(0, len(chunks), batch_size):
+            batcher.encode(chunks[i:i + batch_size])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(process, docs))
+    return time.perf_counter() - start, batcher.encode_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--small-docs", type=int, default=200)
+    parser.add_argument("--large-docs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=64, help="per-document batch (WORKER_EMBED_BATCH_SIZE)")
+    parser.add_argument("--encode-batch-size", type=int, default=128)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    model, model_id = load_embedding_model()
+    print(f"Model: {model_id}")
+    docs = make_docs(args.small_docs, args.large_docs)
+    total = sum(len(d) for d in docs)
+    model.encode(docs[0])  # warm-up
+
+    elapsed = bench_per_document(model, docs, args.batch_size)
+    print(f"per-document : {total} chunks in {elapsed:.2f}s -> {total / elapsed:.1f} chunks/sec")
+
+    elapsed, calls = bench_batched(
+        model, docs, args.batch_size, args.encode_batch_size, args.max_wait_ms / 1000, args.concurrency
+    )
+    print(f"micro-batched: {total} chunks in {elapsed:.2f}s -> {total / elapsed:.1f} chunks/sec ({calls} encode calls)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Parallel PDF text extraction.
+
+Large PDFs are split into page-range shards that are extracted in a
+process pool (pypdf is pure Python, so threads would serialize on the
+GIL). Shards are yielded back in page order with a bounded number in
+flight, which keeps memory flat regardless of page count.
+
+The pool uses the spawn start method: the worker process already runs
+heartbeat, batcher, metrics and database threads, and forking it could
+copy a lock one of them holds into a child that then never gets it.
+"""
+
+import mmap
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+
+EXTRACT_PROCESSES = int(os.environ.get("WORKER_EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+PAGES_PER_SHARD = int(os.environ.get("WORKER_PAGES_PER_SHARD", "16"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if EXTRACT_PROCESSES <= 1:
+        return None
+    # Several extract threads may ask for the pool at once
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _extract_pages(reader, start: int, stop: int):
+    pages = []
+    for index in range(start, stop):
+        text = reader.pages[index].extract_text()
+        if text:
+            pages.append((index + 1, text + "\n"))
+    return pages
+
+
+def extract_page_range(path: str, start: int, stop: int):
+    """Runs in a child process. Returns [(page_number, text)] for pages [start, stop), 1-based numbers."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _extract_pages(PdfReader(data), start, stop)
+
+
+def iter_pdf_pages(stream, spill=None):
+    """
+    Yields (page_number, text) for every non-empty page, in order.
+    Documents with more than PAGES_PER_SHARD pages are sharded across processes;
+    `spill()` must return a path the processes can open (e.g. SpooledDownload.spill),
+    without it everything is extracted in this process.
+    """
+    reader = PdfReader(stream)
+    page_count = len(reader.pages)
+    pool = get_pool()
+
+    # Small documents aren't worth the round trip to another process
+    if pool is None or spill is None or page_count <= PAGES_PER_SHARD:
+        for index in range(page_count):
+            yield from _extract_pages(reader, index, index + 1)
+        return
+
+    path = spill()
+
+    shards = iter(range(0, page_count, PAGES_PER_SHARD))
+    in_flight = deque()
+    max_in_flight = EXTRACT_PROCESSES * 2
+
+    def submit_next():
+        start = next(shards, None)
+        if start is None:
+            return False
+        stop = min(start + PAGES_PER_SHARD, page_count)
+        in_flight.append(pool.submit(extract_page_range, path, start, stop))
+        return True
+
+    while len(in_flight) < max_in_flight and submit_next():
+        pass
+
+    try:
+        while in_flight:
+            pages = in_flight.popleft().result()
+            submit_next()
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,222 @@
+"""
+Streaming building blocks for document ingestion.
+
+Each stage is a generator, so a document flows through
+download -> pages -> chunks -> batches without ever being held in memory
+as a whole: peak memory is bounded by the splitter window and batch size.
+"""
+
+import bisect
+import codecs
+import io
+import mmap
+import os
+import tempfile
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from extract import iter_pdf_pages
+
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+TEXT_BLOCK_SIZE = 64 * 1024
+
+# Downloads: bounded size, explicit timeouts, one pooled session per worker.
+# Files up to SPOOL_MAX_BYTES stay in memory; larger ones go to a temp file
+# that is parsed through mmap, so one oversized upload can't OOM the worker.
+MAX_DOWNLOAD_BYTES = int(float(os.environ.get("WORKER_MAX_DOWNLOAD_MB", "100")) * 1024 * 1024)
+SPOOL_MAX_BYTES = int(float(os.environ.get("WORKER_SPOOL_MAX_MB", "8")) * 1024 * 1024)
+CONNECT_TIMEOUT = float(os.environ.get("WORKER_DOWNLOAD_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("WORKER_DOWNLOAD_READ_TIMEOUT", "60"))
+
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+class SpooledDownload:
+    """
+    Holds a downloaded file in memory until it outgrows SPOOL_MAX_BYTES,
+    then rolls it over to a named temp file. `path` is set only once the
+    file is on disk, which is what lets extraction processes open it;
+    spill() moves a smaller file there on demand.
+    """
+
+    def __init__(self, max_memory: int = SPOOL_MAX_BYTES):
+        self.max_memory = max_memory
+        self.size = 0
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._map = None
+
+    @property
+    def path(self):
+        return self._file.name if self._file else None
+
+    def write(self, block: bytes):
+        self.size += len(block)
+        if self._file is None and self.size > self.max_memory:
+            self._rollover()
+        (self._file or self._buffer).write(block)
+
+    def _rollover(self):
+        self._file = tempfile.NamedTemporaryFile(suffix=".download")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def spill(self) -> str:
+        """Writes an in-memory download to a temp file (if it isn't on disk yet) and returns its path."""
+        if self._file is None:
+            self._rollover()
+        self._file.flush()
+        return self._file.name
+
+    def open_stream(self):
+        """A rewound, seekable read stream: the in-memory buffer or an mmap of the temp file."""
+        if self._file is None:
+            self._buffer.seek(0)
+            return self._buffer
+        self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def download_document(file_url: str, max_bytes: int = MAX_DOWNLOAD_BYTES) -> SpooledDownload:
+    """Streams the file into a SpooledDownload, refusing anything over max_bytes."""
+    spool = SpooledDownload()
+    try:
+        with http.get(file_url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise DownloadTooLarge(f"File is {int(declared)} bytes; limit is {max_bytes}")
+            for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                if spool.size + len(block) > max_bytes:
+                    raise DownloadTooLarge(f"File exceeds the {max_bytes} byte limit")
+                spool.write(block)
+        return spool
+    except Exception:
+        spool.close()
+        raise
+
+
+def iter_pages(download: SpooledDownload, filename: str):
+    """
+    Yields (page_number, text) one page at a time.
+    Plain-text files have no pages, so their blocks carry page_number None.
+    """
+    stream = download.open_stream()
+    if filename.lower().endswith(".pdf"):
+        # PDFs long enough to shard are spilled to disk so extraction processes can open them
+        yield from iter_pdf_pages(stream, download.spill)
+    else:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            block = stream.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if text:
+                yield None, text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield None, tail
+
+
+def iter_chunks(pages, text_splitter, window: int):
+    """
+    Splits a stream of pages into (chunk, page_number) pairs with the given splitter.
+
+    Text is buffered until it exceeds `window` characters; every chunk but
+    the last is emitted and the last one (which may continue on the next
+    page) is carried over. No text is lost, but chunk boundaries near the
+    edge of a window can differ from splitting the whole text at once, since
+    the splitter only sees one window. A chunk is tagged with the page it starts on.
+    """
+    buffer = ""
+    # Parallel lists: offset in buffer where each page starts, and its number
+    page_starts = []
+    page_numbers = []
+
+    def locate(chunks):
+        cursor = 0
+        for chunk in chunks:
+            pos = buffer.find(chunk, cursor)
+            if pos == -1:
+                pos = cursor
+            else:
+                cursor = pos + 1
+            slot = bisect.bisect_right(page_starts, pos) - 1
+            yield chunk, page_numbers[slot] if slot >= 0 else None, pos
+
+    for page_number, text in pages:
+        page_starts.append(len(buffer))
+        page_numbers.append(page_number)
+        buffer += text
+        if len(buffer) < window:
+            continue
+        chunks = text_splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        located = list(locate(chunks))
+        for chunk, chunk_page, _ in located[:-1]:
+            yield chunk, chunk_page
+
+        # The last chunk is a verbatim slice of the buffer (the splitter only strips it)
+        tail_start = located[-1][2]
+        buffer = buffer[tail_start:]
+        slot = max(bisect.bisect_right(page_starts, tail_start) - 1, 0)
+        page_starts = [0] + [start - tail_start for start in page_starts[slot + 1:]]
+        page_numbers = page_numbers[slot:]
+
+    if buffer.strip():
+        for chunk, chunk_page, _ in locate(text_splitter.split_text(buffer)):
+            yield chunk, chunk_page
+
+
+class TimedIterator:
+    """Wraps an iterator and accumulates the time spent producing its items."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def iter_batches(items, batch_size: int):
+    """Groups an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
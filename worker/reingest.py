@@ -0,0 +1,85 @@
+"""
+Incremental re-ingestion.
+
+When a document is replaced, its new chunks are matched by content hash
+against the rows already in document_chunks. Matching rows are kept (and
+renumbered if they moved); only unmatched chunks are embedded and
+inserted, and rows with no counterpart in the new version are deleted.
+"""
+
+import hashlib
+from collections import defaultdict, deque
+
+from studysensei_shared.chunk_writer import LeaseLost, is_lease_lost
+
+PAGE_SIZE = 1000
+
+
+def content_digest(content: str) -> bytes:
+    return hashlib.sha256(content.encode("utf-8")).digest()
+
+
+def load_existing_chunks(supabase, doc_id: str):
+    """Yields the stored chunks of a document page by page, in chunk order."""
+    start = 0
+    while True:
+        response = supabase.table("document_chunks") \
+            .select("id, chunk_index, page_number, content") \
+            .eq("document_id", doc_id) \
+            .order("chunk_index") \
+            .range(start, start + PAGE_SIZE - 1) \
+            .execute()
+        rows = response.data or []
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+
+class ChunkDiff:
+    def __init__(self, existing_rows):
+        # Only hashes and ids are kept, not the stored text
+        self._by_digest = defaultdict(deque)
+        for row in existing_rows:
+            self._by_digest[content_digest(row["content"])].append(
+                (row["id"], row["chunk_index"], row.get("page_number"))
+            )
+        self.kept = 0
+        self.moved = []
+
+    def match(self, content: str, chunk_index: int, page_number) -> bool:
+        """Claims a stored row with the same content. Returns False if the chunk is new."""
+        rows = self._by_digest.get(content_digest(content))
+        if not rows:
+            return False
+        row_id, old_index, old_page = rows.popleft()
+        if old_index != chunk_index or old_page != page_number:
+            self.moved.append((row_id, chunk_index, page_number))
+        else:
+            self.kept += 1
+        return True
+
+    def stale_ids(self):
+        return [row_id for rows in self._by_digest.values() for row_id, _, _ in rows]
+
+    def apply(self, supabase, doc_id: str, worker_id: str, generation: int):
+        """
+        Deletes rows the new version no longer has and renumbers moved ones, in one
+        transaction that only commits while worker_id still holds lease `generation`.
+        """
+        ids, indexes, pages = zip(*self.moved) if self.moved else ((), (), ())
+        try:
+            response = supabase.rpc("apply_chunk_diff", {
+                "doc_id": doc_id,
+                "worker_id": worker_id,
+                "lease_generation": generation,
+                "stale_ids": self.stale_ids(),
+                "chunk_ids": list(ids),
+                "chunk_indexes": list(indexes),
+                "page_numbers": list(pages)
+            }).execute()
+        except Exception as e:
+            if is_lease_lost(e):
+                raise LeaseLost(str(e)) from e
+            raise
+        return response.data or 0
@@ -0,0 +1,52 @@
+"""
+Stage bookkeeping for the overlapped ingestion pipeline.
+
+Each pipeline stage runs a fixed number of asyncio worker tasks reading
+from a bounded queue. StageMonitor records how long those workers spend
+busy, so the periodic report shows which stage is the bottleneck
+(utilization near 100%) and which ones sit idle.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StageMonitor:
+    def __init__(self):
+        self.workers = {}
+        self.busy = {}
+        self.items = {}
+        self.queues = {}
+        self._window_start = time.monotonic()
+
+    def add_stage(self, name: str, workers: int, queue=None):
+        self.workers[name] = workers
+        self.busy[name] = 0.0
+        self.items[name] = 0
+        if queue is not None:
+            self.queues[name] = queue
+
+    @contextmanager
+    def track(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.busy[name] += time.monotonic() - start
+            self.items[name] += 1
+
+    def report(self) -> str:
+        """Utilization per stage since the last report, then resets the window."""
+        elapsed = max(time.monotonic() - self._window_start, 1e-9)
+        parts = []
+        for name, workers in self.workers.items():
+            utilization = self.busy[name] / (elapsed * workers)
+            depth = f", queue {self.queues[name].qsize()}" if name in self.queues else ""
+            parts.append(f"{name} {utilization:.0%} ({self.items[name]} items{depth})")
+            self.busy[name] = 0.0
+            self.items[name] = 0
+        self._window_start = time.monotonic()
+        return " | ".join(parts)
+
+    def idle(self) -> bool:
+        return not any(self.items.values())
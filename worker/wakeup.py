@@ -0,0 +1,139 @@
+"""
+Wake-up channels for the ingestion worker.
+
+When the queue is empty the worker blocks on these instead of sleeping a
+fixed interval, so a fresh upload is picked up right away:
+
+- PgNotifyChannel: Postgres LISTEN/NOTIFY (needs DATABASE_URL)
+- LocalChannel: UDP datagrams from the backend, for dev setups without a
+  direct Postgres connection (needs WORKER_WAKE_PORT)
+
+With neither configured, or while none of them is connected, the worker
+falls back to plain polling.
+"""
+
+import os
+import select
+import socket
+import time
+
+NOTIFY_CHANNEL = "document_pending"
+
+
+class PgNotifyChannel:
+    name = "pg-notify"
+
+    def __init__(self, dsn: str, channel: str = NOTIFY_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self.conn = None
+        # LISTEN before the first claim so no insert slips in between
+        self.ensure_connected()
+
+    def ensure_connected(self) -> bool:
+        if self.conn is not None and not self.conn.closed:
+            return True
+        try:
+            import psycopg2
+
+            self.conn = psycopg2.connect(self.dsn)
+            self.conn.autocommit = True
+            with self.conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel};")
+            return True
+        except Exception as e:
+            print(f"Could not LISTEN on {self.channel}: {e}")
+            self.conn = None
+            return False
+
+    def fileno(self) -> int:
+        return self.conn.fileno()
+
+    def drain(self) -> bool:
+        try:
+            self.conn.poll()
+        except Exception as e:
+            print(f"LISTEN connection lost: {e}")
+            self.conn = None
+            return False
+        woken = bool(self.conn.notifies)
+        self.conn.notifies.clear()
+        return woken
+
+
+class LocalChannel:
+    name = "local-udp"
+
+    def __init__(self, port: int, host: str = "0.0.0.0"):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+    def ensure_connected(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def drain(self) -> bool:
+        # Swallow a whole burst of wake-ups so one claim round handles them all
+        woken = False
+        try:
+            while True:
+                self.sock.recvfrom(1024)
+                woken = True
+        except (BlockingIOError, OSError):
+            pass
+        return woken
+
+
+class Wakeup:
+    def __init__(self, channels):
+        self.channels = channels
+
+    @property
+    def name(self) -> str:
+        return "+".join(c.name for c in self.channels) or "poll"
+
+    def wait(self, timeout: float, poll_interval: float = None) -> bool:
+        """
+        Blocks until a notification arrives or timeout elapses. Returns True if woken.
+        While no channel is connected (e.g. LISTEN failed on a bad DSN) nothing can
+        wake us, so it only sleeps poll_interval (when given) before the next claim.
+        """
+        if poll_interval is None:
+            poll_interval = timeout
+        live = [c for c in self.channels if c.ensure_connected()]
+        if not live:
+            time.sleep(min(timeout, poll_interval))
+            return False
+
+        # Notifications may already be buffered from the last round
+        if any([c.drain() for c in live]):
+            return True
+
+        live = [c for c in live if c.ensure_connected()]
+        if not live:
+            time.sleep(min(timeout, poll_interval))
+            return False
+
+        ready, _, _ = select.select(live, [], [], timeout)
+        return any([c.drain() for c in ready])
+
+
+def create_wakeup() -> Wakeup:
+    """Builds every channel the environment configures."""
+    channels = []
+
+    dsn = os.environ.get("DATABASE_URL")
+    if dsn:
+        channels.append(PgNotifyChannel(dsn))
+
+    port = os.environ.get("WORKER_WAKE_PORT")
+    if port:
+        try:
+            channels.append(LocalChannel(int(port)))
+        except OSError as e:
+            print(f"Could not bind wake-up port {port}: {e}")
+
+    return Wakeup(channels)
@@ -1,13 +1,22 @@
+import asyncio
 import time
 import os
-import io
-import requests
+import socket
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from uuid import uuid4
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from wakeup import create_wakeup
+from pipeline import download_document, iter_pages, iter_chunks, iter_batches, TimedIterator
+from batcher import EmbeddingBatcher
+from studysensei_shared.chunk_writer import ChunkWriter, LeaseLost
+from studysensei_shared.embedding_cache import EmbeddingCache, CachedEncoder
+from studysensei_shared.embedding_backend import load_embedding_model
+from reingest import ChunkDiff, load_existing_chunks
+from stages import StageMonitor
+from metrics import Registry, start_metrics_server
 
 # Load env vars
 env_path = ".env"
@@ -25,121 +34,533 @@ key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")  # Use service role key f
 if not url or not key:
     print("WARNING: SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set in .env file for worker to function.")
 
-try:
-    supabase: Client = create_client(url, key) if url and key else None
-except Exception as e:
-    print(f"Error initializing Supabase client: {e}")
-    supabase = None
+# Job queue settings. Every replica claims rows through the claim_documents RPC,
+# so running more workers only needs a unique WORKER_ID (defaults to host/pid).
+# Each replica works on up to CONCURRENT_DOCUMENTS at once and only claims
+# as many documents as it has free slots.
+WORKER_ID = os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+CONCURRENT_DOCUMENTS = int(os.environ.get("WORKER_CONCURRENT_DOCUMENTS", "4"))
+LEASE_SECONDS = int(os.environ.get("WORKER_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.environ.get("WORKER_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "5"))
+# With a push channel the idle wait is only a safety net (e.g. to re-claim
+# documents whose lease expired), so it can be much longer than the poll interval.
+IDLE_TIMEOUT = float(os.environ.get("WORKER_IDLE_TIMEOUT", "60"))
+# Fair scheduling cost per document is file_size + this many bytes, so a burst of
+# tiny uploads still counts against its user (see phase10_fair_scheduling.sql).
+COST_OVERHEAD = int(os.environ.get("WORKER_COST_OVERHEAD_BYTES", str(256 * 1024)))
+
+# Streaming ingestion: chunks are embedded and inserted EMBED_BATCH_SIZE at a
+# time, so memory per document is bounded by the batch, not the file size.
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+EMBED_BATCH_SIZE = int(os.environ.get("WORKER_EMBED_BATCH_SIZE", "64"))
+SPLIT_WINDOW = CHUNK_SIZE * 8
+
+# Chunks from concurrently processed documents are packed into shared encode
+# calls of ENCODE_BATCH_SIZE, waiting at most ENCODE_MAX_WAIT_MS to fill one.
+ENCODE_BATCH_SIZE = int(os.environ.get("WORKER_ENCODE_BATCH_SIZE", "128"))
+ENCODE_MAX_WAIT = float(os.environ.get("WORKER_ENCODE_MAX_WAIT_MS", "50")) / 1000
+
+# Overlapped pipeline: download -> extract/chunk -> embed -> store, with bounded
+# queues between stages. Each stage runs this many asyncio worker tasks; blocking
+# client calls are pushed to threads and extraction to the process pool.
+DOWNLOAD_CONCURRENCY = int(os.environ.get("WORKER_DOWNLOAD_CONCURRENCY", "4"))
+EXTRACT_CONCURRENCY = int(os.environ.get("WORKER_EXTRACT_CONCURRENCY", "2"))
+EMBED_CONCURRENCY = int(os.environ.get("WORKER_EMBED_CONCURRENCY", "4"))
+STORE_CONCURRENCY = int(os.environ.get("WORKER_STORE_CONCURRENCY", "4"))
+STAGE_QUEUE_SIZE = int(os.environ.get("WORKER_STAGE_QUEUE_SIZE", "8"))
+STATS_INTERVAL = float(os.environ.get("WORKER_STATS_INTERVAL", "30"))
+
+# Prometheus metrics on http://<worker>:WORKER_METRICS_PORT/metrics (0 disables).
+# Queue counts are read from the database at most every METRICS_COUNT_TTL seconds.
+METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9100"))
+METRICS_COUNT_TTL = float(os.environ.get("WORKER_METRICS_COUNT_TTL", "15"))
+
+metrics = Registry()
+STAGE_SECONDS = metrics.histogram(
+    "worker_stage_duration_seconds",
+    "Time spent per stage (download per document; extract, chunk, embed, insert per batch)",
+    ["stage"]
+)
+EMBEDDED_CHUNKS = metrics.counter("worker_embedded_chunks_total", "Chunks passed through the embed stage")
+DOCUMENTS_FINISHED = metrics.counter("worker_documents_finished_total", "Documents finished by this worker", ["result"])
+MODEL_LOAD_SECONDS = metrics.gauge("worker_model_load_seconds", "Time taken to load the embedding model")
+# Queue wait + processing, from the document (re-)entering the queue to status=ready.
+# claim_documents schedules users fairly, so no user's p95 should balloon under a bulk upload.
+TIME_TO_READY = metrics.histogram(
+    "worker_time_to_ready_seconds",
+    "Seconds from a document being queued to it being ready",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+TIME_TO_READY_P95 = metrics.window_quantile(
+    "worker_time_to_ready_p95_seconds",
+    "p95 time-to-ready over each user's recent documents",
+    ["user_id"],
+    quantile=0.95
+)
 
-# Initialize models (loading global to avoid reloading per task)
-print("Loading models...")
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-    )
-    print("Models loaded.")
-except Exception as e:
-    print(f"Error loading models: {e}")
-    # In a real scenario we might exit, but here we keep running to avoid crash loops
+# Clients and models are created once per process (not per task).
+# PDF extraction processes (extract.py, spawn start method) re-import this module
+# as __mp_main__; they only parse pages, so they skip the model, the Supabase
+# client, the chunk writer and the embedding cache's SQLite connection.
+if __name__ == "__mp_main__":
+    supabase = None
+    chunk_writer = None
+    embedding_cache = None
     embedding_model = None
+    embedding_batcher = None
+    embedding_encoder = None
     text_splitter = None
+else:
+    try:
+        supabase: Client = create_client(url, key) if url and key else None
+    except Exception as e:
+        print(f"Error initializing Supabase client: {e}")
+        supabase = None
 
-def process_document(doc):
-    if not supabase or not embedding_model:
-        print("Worker not fully initialized (Supabase or Models missing). Skipping process.")
-        time.sleep(10)
-        return
+    # Paged chunk inserts (COPY when CHUNK_COPY_DSN gives a direct connection)
+    chunk_writer = ChunkWriter(supabase) if supabase else None
 
+    # Local on-disk cache of chunk embeddings (re-uploaded lecture notes skip the model)
     try:
-        doc_id = doc['id']
-        file_url = doc['file_url']
-        print(f"Processing document {doc_id}...")
-
-        # Update status to processing
-        supabase.table("documents").update({"status": "processing"}).eq("id", doc_id).execute()
-
-        # Download file
-        # Note: file_url might be a public URL or Signed URL.
-        # If it's a public URL we can use requests.
-        response = requests.get(file_url)
-        response.raise_for_status()
-        file_content = response.content
-        
-        # Extract Text
-        content = ""
-        filename = doc['filename'].lower()
-        if filename.endswith(".pdf"):
-            pdf_file = io.BytesIO(file_content)
-            reader = PdfReader(pdf_file)
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    content += text + "\n"
-        else:
-            content = file_content.decode("utf-8")
-
-        # Chunk
-        chunks = text_splitter.split_text(content)
-        
-        # Embed
-        embeddings = embedding_model.encode(chunks)
-        
-        # Save chunks
+        embedding_cache = EmbeddingCache()
+    except Exception as e:
+        print(f"Embedding cache disabled: {e}")
+        embedding_cache = None
+
+    print("Loading models...")
+    try:
+        load_start = time.perf_counter()
+        # EMBEDDING_BACKEND=onnx-int8 runs a quantized graph (see studysensei_shared/embedding_backend.py)
+        embedding_model, embedding_model_id = load_embedding_model()
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - load_start)
+        embedding_batcher = EmbeddingBatcher(embedding_model, ENCODE_BATCH_SIZE, ENCODE_MAX_WAIT)
+        # Cache hits are served before anything is queued on the batcher
+        embedding_encoder = CachedEncoder(embedding_batcher, embedding_cache, embedding_model_id)
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+        )
+        print(f"Models loaded ({embedding_model_id}).")
+    except Exception as e:
+        print(f"Error loading models: {e}")
+        # In a real scenario we might exit, but here we keep running to avoid crash loops
+        embedding_model = None
+        embedding_batcher = None
+        embedding_encoder = None
+        text_splitter = None
+
+_status_counts = {"at": 0.0, "counts": {}}
+
+def count_documents_by_status():
+    """Queue depth for the metrics endpoint, cached so scrapes don't hammer the database."""
+    if time.monotonic() - _status_counts["at"] > METRICS_COUNT_TTL:
+        counts = {}
+        for status in ("pending", "processing", "failed"):
+            response = supabase.table("documents").select("id", count="exact").eq("status", status).limit(1).execute()
+            counts[(status,)] = response.count or 0
+        _status_counts.update(at=time.monotonic(), counts=counts)
+    return _status_counts["counts"]
+
+
+metrics.gauge("worker_documents", "Documents by ingestion status", ["status"], function=count_documents_by_status)
+metrics.gauge(
+    "worker_embedding_model_chunks_per_second",
+    "Average model throughput over all encode calls",
+    function=lambda: embedding_batcher.texts_per_sec if embedding_batcher else 0
+)
+metrics.gauge(
+    "worker_embedding_cache_hit_ratio",
+    "Share of chunk lookups served from the embedding cache",
+    function=lambda: embedding_cache.hit_rate if embedding_cache else 0
+)
+
+
+class LeaseHeartbeat:
+    """
+    Keeps the lease on a claimed document alive from a background thread.
+    If the worker crashes, heartbeats stop and the row becomes claimable
+    again once lease_expires_at passes.
+
+    The local `lost` flag only lets a job stop early; chunk writes are fenced
+    on (worker, generation) by the database itself, so a job that hasn't
+    noticed yet can't write anything either.
+    """
+
+    def __init__(self, doc_id: str, generation: int):
+        self.doc_id = doc_id
+        self.generation = generation
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        # Renew well before expiry so one slow round trip doesn't lose the job
+        interval = max(LEASE_SECONDS / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                response = supabase.rpc("heartbeat_document", {
+                    "doc_id": self.doc_id,
+                    "worker_id": WORKER_ID,
+                    "lease_seconds": LEASE_SECONDS,
+                    "lease_generation": self.generation
+                }).execute()
+                if response.data is False:
+                    print(f"Lease lost for document {self.doc_id}.")
+                    self.lost.set()
+                    return
+            except Exception as e:
+                print(f"Heartbeat error for document {self.doc_id}: {e}")
+
+    def check(self):
+        if self.lost.is_set():
+            raise LeaseLost(f"Lease on document {self.doc_id} was lost")
+
+
+def claim_documents(batch_size: int):
+    """
+    Atomically claims pending (or lease-expired) documents for this worker,
+    round-robin across users with small documents first.
+    """
+    response = supabase.rpc("claim_documents", {
+        "worker_id": WORKER_ID,
+        "batch_size": batch_size,
+        "lease_seconds": LEASE_SECONDS,
+        "max_attempts": MAX_ATTEMPTS,
+        "cost_overhead": COST_OVERHEAD
+    }).execute()
+    return response.data or []
+
+
+class DocumentJob:
+    """
+    One claimed document moving through the pipeline stages.
+    Only touched from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.id = doc['id']
+        # Bumped by every claim (phase20_chunk_write_fencing.sql); fences our writes
+        self.generation = doc.get('generation', 0)
+        self.lease = LeaseHeartbeat(self.id, self.generation)
+        self.download = None
+        self.diff = None
+        self.chunk_count = 0
+        self.inserted = 0
+        # Batches handed to embed/store that haven't been stored yet
+        self.outstanding = 0
+        self.extracted = False
+        self.error = None
+        self.done = asyncio.Event()
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+
+    def finish_extraction(self):
+        self.extracted = True
+        self._check_done()
+
+    def finish_batch(self):
+        self.outstanding -= 1
+        self._check_done()
+
+    def _check_done(self):
+        # Even a failed job drains its queued batches before cleanup closes the download
+        if self.extracted and self.outstanding == 0:
+            self.done.set()
+
+
+async def download_stage(download_q, extract_q, monitor):
+    while True:
+        job = await download_q.get()
+        try:
+            job.lease.check()
+            with monitor.track("download"):
+                # Note: file_url might be a public URL or Signed URL.
+                # Streamed with a size cap; large files spill to disk and are parsed via mmap.
+                start = time.perf_counter()
+                job.download = await asyncio.to_thread(download_document, job.doc['file_url'])
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage="download")
+                # Chunks already stored for this document (a replaced file, or an
+                # earlier attempt that died mid-insert) are reused when unchanged
+                job.diff = await asyncio.to_thread(lambda: ChunkDiff(load_existing_chunks(supabase, job.id)))
+        except Exception as e:
+            job.fail(e)
+            job.finish_extraction()
+            continue
+        await extract_q.put(job)
+
+
+async def extract_stage(extract_q, embed_q, monitor):
+    while True:
+        job = await extract_q.get()
+        pages = TimedIterator(iter_pages(job.download, job.doc['filename']))
+        batches = iter_batches(iter_chunks(pages, text_splitter, SPLIT_WINDOW), EMBED_BATCH_SIZE)
+
+        def next_batch():
+            # Splits the time of one batch into page extraction and chunking
+            start, extract_before = time.perf_counter(), pages.seconds
+            batch = next(batches, None)
+            extract_seconds = pages.seconds - extract_before
+            return batch, extract_seconds, time.perf_counter() - start - extract_seconds
+
+        try:
+            while job.error is None:
+                with monitor.track("extract"):
+                    batch, extract_seconds, chunk_seconds = await asyncio.to_thread(next_batch)
+                STAGE_SECONDS.observe(extract_seconds, stage="extract")
+                STAGE_SECONDS.observe(chunk_seconds, stage="chunk")
+                if batch is None:
+                    break
+
+                new_chunks = []
+                for chunk, page_number in batch:
+                    if not job.diff.match(chunk, job.chunk_count, page_number):
+                        new_chunks.append((chunk, job.chunk_count, page_number))
+                    job.chunk_count += 1
+
+                if new_chunks:
+                    job.outstanding += 1
+                    # Blocks when the embed stage falls behind
+                    await embed_q.put((job, new_chunks))
+        except Exception as e:
+            job.fail(e)
+        job.finish_extraction()
+
+
+async def embed_stage(embed_q, store_q, monitor):
+    while True:
+        job, new_chunks = await embed_q.get()
+        if job.error is not None:
+            job.finish_batch()
+            continue
+        try:
+            with monitor.track("embed"):
+                # Shared with other in-flight documents through the batcher
+                start = time.perf_counter()
+                embeddings = await asyncio.to_thread(
+                    embedding_encoder.encode, [chunk for chunk, _, _ in new_chunks]
+                )
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage="embed")
+                EMBEDDED_CHUNKS.inc(len(new_chunks))
+        except Exception as e:
+            job.fail(e)
+            job.finish_batch()
+            continue
+
         records = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        for (chunk, index, page_number), embedding in zip(new_chunks, embeddings):
             records.append({
-                "document_id": doc_id,
+                "document_id": job.id,
+                "skill_id": job.doc.get("skill_id"),
                 "content": chunk,
-                "embedding": embedding.tolist(),
-                "chunk_index": i
+                "embedding": embedding,
+                "chunk_index": index,
+                "page_number": page_number
             })
+        await store_q.put((job, records))
+
+
+async def store_stage(store_q, monitor):
+    while True:
+        job, records = await store_q.get()
+        if job.error is None:
+            try:
+                job.lease.check()
+                with monitor.track("store"):
+                    start = time.perf_counter()
+                    job.inserted += await asyncio.to_thread(
+                        chunk_writer.write, records, (job.id, WORKER_ID, job.generation)
+                    )
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage="insert")
+            except Exception as e:
+                job.fail(e)
+        job.finish_batch()
+
+
+def record_time_to_ready(doc):
+    queued_at = doc.get("queued_at") or doc.get("created_at")
+    if not queued_at:
+        return
+    try:
+        queued = datetime.fromisoformat(queued_at.replace("Z", "+00:00"))
+    except ValueError:
+        return
+    seconds = max((datetime.now(timezone.utc) - queued).total_seconds(), 0.0)
+    TIME_TO_READY.observe(seconds)
+    TIME_TO_READY_P95.observe(seconds, user_id=doc.get("user_id", ""))
+
+
+def finish_job(job):
+    """Runs after every batch of the job has been stored (or dropped)."""
+    doc_id = job.id
+    try:
+        if job.error is not None:
+            raise job.error
+
+        job.lease.check()
+        removed = job.diff.apply(supabase, doc_id, WORKER_ID, job.generation)
+
+        diff = job.diff
+        print(f"Document {doc_id}: {job.chunk_count} chunks ({job.inserted} embedded, "
+              f"{diff.kept + len(diff.moved)} reused, {len(diff.moved)} renumbered, {removed} removed).")
+        cache_note = f", cache hit rate {embedding_cache.hit_rate:.1%}" if embedding_cache else ""
+        print(f"Writer: {chunk_writer.rows_per_sec:.0f} rows/sec overall{cache_note}.")
         
-        if records:
-            supabase.table("document_chunks").insert(records).execute()
-        
-        # Update status to ready
+        # Update status to ready (only if this claim still owns the job and it wasn't re-queued meanwhile)
         supabase.table("documents").update({
             "status": "ready", 
             "processed": True,
-            "error_message": None
-        }).eq("id", doc_id).execute()
+            "error_message": None,
+            "locked_by": None,
+            "lease_expires_at": None
+        }).eq("id", doc_id).eq("locked_by", WORKER_ID).eq("generation", job.generation) \
+            .eq("status", "processing").execute()
         
         print(f"Document {doc_id} processed successfully.")
+        DOCUMENTS_FINISHED.inc(result="ready")
+        record_time_to_ready(job.doc)
+
+    except LeaseLost as e:
+        # Another worker owns the job now; leave the row alone
+        print(f"Abandoning document {doc_id}: {e}")
+        DOCUMENTS_FINISHED.inc(result="abandoned")
 
     except Exception as e:
-        print(f"Error processing document {doc['id']}: {e}")
+        print(f"Error processing document {doc_id}: {e}")
+        DOCUMENTS_FINISHED.inc(result="failed")
         supabase.table("documents").update({
             "status": "failed", 
-            "error_message": str(e)
-        }).eq("id", doc['id']).execute()
+            "error_message": str(e),
+            "locked_by": None,
+            "lease_expires_at": None
+        }).eq("id", doc_id).eq("locked_by", WORKER_ID).eq("generation", job.generation) \
+            .eq("status", "processing").execute()
 
-def main():
-    print("Worker started. Polling for pending documents...")
+
+async def run_job(job, download_q, previous=None):
+    print(f"Processing document {job.id} (attempt {job.doc.get('attempts', 1)})...")
+    job.lease.start()
+    try:
+        if previous is not None:
+            # The document was replaced while we still had its old version in flight:
+            # let that job abandon at its next lease check before touching the chunks
+            await asyncio.wait([previous])
+        await download_q.put(job)
+        await job.done.wait()
+        await asyncio.to_thread(finish_job, job)
+    finally:
+        # stop() joins the heartbeat thread, which may be mid-RPC; don't block the loop on it
+        await asyncio.to_thread(job.lease.stop)
+        if job.download is not None:
+            job.download.close()
+
+
+async def report_stages(monitor):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        idle = monitor.idle()
+        summary = monitor.report()
+        if not idle:
+            print(f"Stage utilization: {summary}")
+
+
+async def run_pipeline():
+    loop = asyncio.get_running_loop()
+    # Every stage worker, job supervisor and the wake-up wait may sit in a thread at once
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=DOWNLOAD_CONCURRENCY + EXTRACT_CONCURRENCY + EMBED_CONCURRENCY
+        + STORE_CONCURRENCY + CONCURRENT_DOCUMENTS + 2
+    ))
+
+    download_q = asyncio.Queue(maxsize=CONCURRENT_DOCUMENTS)
+    extract_q = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    embed_q = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    store_q = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+
+    monitor = StageMonitor()
+    monitor.add_stage("download", DOWNLOAD_CONCURRENCY, download_q)
+    monitor.add_stage("extract", EXTRACT_CONCURRENCY, extract_q)
+    monitor.add_stage("embed", EMBED_CONCURRENCY, embed_q)
+    monitor.add_stage("store", STORE_CONCURRENCY, store_q)
+
+    workers = [asyncio.create_task(report_stages(monitor))]
+    workers += [asyncio.create_task(download_stage(download_q, extract_q, monitor)) for _ in range(DOWNLOAD_CONCURRENCY)]
+    workers += [asyncio.create_task(extract_stage(extract_q, embed_q, monitor)) for _ in range(EXTRACT_CONCURRENCY)]
+    workers += [asyncio.create_task(embed_stage(embed_q, store_q, monitor)) for _ in range(EMBED_CONCURRENCY)]
+    workers += [asyncio.create_task(store_stage(store_q, monitor)) for _ in range(STORE_CONCURRENCY)]
+
+    wakeup = create_wakeup()
+    # The wake-up wait runs in a thread and outlives loop iterations: a job finishing
+    # first doesn't cancel it, so there is never more than one select() on the channels
+    waiter = None
+    active = set()
+    running = {}  # document id -> (job, task), to catch a replaced document claimed again
+    print(f"Worker {WORKER_ID} started (wake-up: {wakeup.name}). Claiming pending documents...")
     while True:
         try:
-            if not supabase:
-                print("Supabase client not initialized. Retrying in 10s...")
-                time.sleep(10)
+            active = {task for task in active if not task.done()}
+            running = {doc_id: entry for doc_id, entry in running.items() if not entry[1].done()}
+            free_slots = CONCURRENT_DOCUMENTS - len(active)
+            if free_slots == 0:
+                await asyncio.wait(active, return_when=asyncio.FIRST_COMPLETED)
                 continue
 
-            # Fetch pending documents
-            response = supabase.table("documents").select("*").eq("status", "pending").execute()
-            docs = response.data
+            # Claim a batch; other replicas skip the rows we locked
+            docs = await asyncio.to_thread(claim_documents, free_slots)
             
             if docs:
-                print(f"Found {len(docs)} pending documents.")
+                print(f"Claimed {len(docs)} documents.")
                 for doc in docs:
-                    process_document(doc)
+                    job, previous = DocumentJob(doc), None
+                    if job.id in running:
+                        old_job, previous = running[job.id]
+                        old_job.lease.lost.set()
+                    task = asyncio.create_task(run_job(job, download_q, previous))
+                    running[job.id] = (job, task)
+                    active.add(task)
             else:
-                # Sleep if no docs
-                time.sleep(5)
-                
+                # Claim again once an upload notifies us, a job frees its slot, or the
+                # idle timeout passes; polls every POLL_INTERVAL while no wake-up channel
+                # is connected
+                if waiter is None:
+                    waiter = asyncio.ensure_future(asyncio.to_thread(wakeup.wait, IDLE_TIMEOUT, POLL_INTERVAL))
+                await asyncio.wait(active | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+                if waiter.done():
+                    finished, waiter = waiter, None
+                    finished.result()
+
         except Exception as e:
             print(f"Error in polling loop: {e}")
-            time.sleep(5)
+            await asyncio.sleep(POLL_INTERVAL)
+
+def main():
+    if METRICS_PORT:
+        start_metrics_server(metrics, METRICS_PORT)
+        print(f"Metrics on :{METRICS_PORT}/metrics")
+    while not supabase or not embedding_encoder:
+        print("Worker not fully initialized (Supabase or Models missing). Retrying in 10s...")
+        time.sleep(10)
+    asyncio.run(run_pipeline())
 
 if __name__ == "__main__":
     main()